@@ -0,0 +1,247 @@
+import asyncio, bisect, itertools, os, pickle, time, typing;
+from array import array;
+from collections import Counter;
+from cache import PickleCacheManager, SingleFlight;
+from mediawiki import AsyncSite;
+from utils import chunk_list, parse_timestamp;
+
+class RecentChangesAggregator:
+	"""Keeps a site's edits and page creations as a compact, persistent columnar log.
+
+	Every change is one row across four parallel arrays: timestamp, interned user id, type
+	and namespace. Rows arrive in timestamp order, so counting any window is one bisect to
+	find where it starts and one pass over the slice, done in C by ``bytes.translate``,
+	``itertools.compress`` and ``Counter``. The last seen ``rcid`` and timestamp are kept
+	alongside, so a refresh only asks the API for changes newer than that cursor.
+	"""
+
+	types = {"edit": 0, "new": 1};
+
+	def __init__(self, site: AsyncSite, filename: str):
+		self.site = site;
+		self.filename = filename;
+		self.lock = asyncio.Lock();
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self.state = PickleCacheManager.get_cache(filename, default=self.empty());
+		if "timestamps" not in self.state:
+			self.state.clear(); # counters from before the log existed, crawl again
+			self.state.update(self.empty());
+		self.ids = {user: index for index, user in enumerate(self.state["users"])};
+
+	@staticmethod
+	def empty():
+		return {
+			"rcid": 0,
+			"timestamp": None,
+			"users": [],
+			"timestamps": array("q"),
+			"user_ids": array("I"),
+			"types": array("B"),
+			"namespaces": array("i")
+		};
+
+	def reset(self):
+		self.state.update(self.empty());
+		self.ids.clear();
+
+	def intern(self, user: str):
+		if (index := self.ids.get(user)) is None:
+			index = self.ids[user] = len(self.state["users"]);
+			self.state["users"].append(user);
+		return index;
+
+	def fold(self, change: dict):
+		if change.get("rcid", 0) <= self.state["rcid"]:
+			return False;
+
+		if "user" in change and change.get("type") in self.types:
+			self.state["timestamps"].append(int(parse_timestamp(change["timestamp"]).timestamp()));
+			self.state["user_ids"].append(self.intern(change["user"]));
+			self.state["types"].append(self.types[change["type"]]);
+			self.state["namespaces"].append(change.get("ns", 0));
+
+		self.state["rcid"] = change["rcid"];
+		self.state["timestamp"] = change.get("timestamp", self.state["timestamp"]);
+		return True;
+
+	async def refresh(self):
+		async with self.lock:
+			params = {
+				"list": "recentchanges",
+				"rcprop": "ids|title|user|timestamp",
+				"rctype": "edit|new",
+				"rcdir": "newer",
+				"rclimit": "max",
+				"rcstart": self.state["timestamp"]
+			};
+
+			folded = 0;
+			async for query in self.site.query(**params):
+				for change in query.get("recentchanges", []):
+					folded += self.fold(change);
+
+			if folded:
+				await asyncio.get_running_loop().run_in_executor(None, PickleCacheManager.sync_cache, self.filename);
+			return folded;
+
+	def count(self, types: typing.Iterable[str], since: typing.Optional[float] = None) -> typing.Counter[str]:
+		"""Counts changes of the given types per user, from ``since`` (a UNIX timestamp) onwards."""
+		start = bisect.bisect_left(self.state["timestamps"], since) if since is not None else 0;
+		codes = {self.types[kind] for kind in types};
+		mask = self.state["types"][start:].tobytes().translate(bytes(code in codes for code in range(256)));
+		counts = Counter(itertools.compress(self.state["user_ids"][start:], mask));
+		users = self.state["users"];
+		return Counter({users[index]: count for index, count in counts.items()});
+
+	def leaderboards(self, limit: typing.Optional[int] = 50, since: typing.Optional[float] = None):
+		return (self.count(("edit",), since).most_common(limit), self.count(("new",), since).most_common(limit));
+
+class ContributionsAggregator:
+	"""Keeps a persistent per-user contribution table built from ``list=allusers&auprop=editcount``.
+
+	A full sweep costs one request per 500 users. Between sweeps, only users active in the
+	last 30 days (``auactiveusers``) are re-read, which keeps refreshes to a page or two.
+	"""
+
+	def __init__(self, site: AsyncSite, filename: str, sweep_interval: float = 86400):
+		self.site = site;
+		self.filename = filename;
+		self.sweep_interval = sweep_interval;
+		self.lock = asyncio.Lock();
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self.state = PickleCacheManager.get_cache(filename, default={
+			"swept": 0,
+			"contribs": Counter()
+		});
+
+	async def refresh(self):
+		async with self.lock:
+			full = (time.time() - self.state["swept"]) > self.sweep_interval;
+			params = {
+				"list": "allusers",
+				"auprop": "editcount",
+				"aulimit": "max",
+				"auactiveusers": not full
+			};
+
+			contribs = Counter() if full else self.state["contribs"];
+			async for query in self.site.query(**params):
+				for user in query.get("allusers", []):
+					if user.get("editcount", 0) > 0:
+						contribs[user["name"]] = user["editcount"];
+
+			self.state["contribs"] = contribs;
+			if full:
+				self.state["swept"] = time.time();
+			await asyncio.get_running_loop().run_in_executor(None, PickleCacheManager.sync_cache, self.filename);
+
+	def leaderboard(self, limit: typing.Optional[int] = 50):
+		return self.state["contribs"].most_common(limit);
+
+class Leaderboards:
+	"""Rendered leaderboard pages for every site, kept on disk and refreshed ahead of expiry.
+
+	Pages are rendered for every period at once, since counting a window in the change
+	log is cheap. Lifetime contributions come from the users' edit counts; every other
+	board is counted from the log. The pages and the aggregators' state live in pickles under ``cache/`` and are owned
+	by the bot rather than a cog, so neither restarts nor hot reloads lose them. Stored pages
+	are always served as they are; a background task recomputes them once they are dirtied
+	by a change or get close to ``max_age``, and callers only ever wait for a site that has
+	never been computed.
+	"""
+
+	units = {"edits": "edit(s)", "new_pages": "page(s)", "contribs": "contribution(s)"};
+	periods = {"24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400, "all": None};
+	medals = {0: ":first_place:", 1: ":second_place:", 2: ":third_place:"};
+
+	def __init__(self, sites: typing.Iterable[typing.Tuple[str, AsyncSite]], filename: str = "cache/leaderboards.pkl", max_age: float = 3600, refresh_ahead: float = 0.8, limit: int = 50, per_page: int = 10):
+		self.sites = dict(sites);
+		self.filename = filename;
+		self.max_age = max_age;
+		self.refresh_ahead = refresh_ahead;
+		self.limit = limit;
+		self.per_page = per_page;
+		self.flights = SingleFlight();
+		self.persisting = asyncio.Lock(); # keeps snapshots from reaching the disk out of order
+		self.dirty: typing.Set[typing.Tuple[str, str]] = set();
+		self.recentchanges: typing.Dict[str, RecentChangesAggregator] = {};
+		self.contributions: typing.Dict[str, ContributionsAggregator] = {};
+		self.state: typing.Optional[dict] = None;
+
+	def load(self):
+		"""Reads the stored pages and counters; blocking, so run it in an executor."""
+		os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True);
+		self.state = PickleCacheManager.get_cache(self.filename, default={"pages": {}, "computed": {}});
+		for name, site in self.sites.items():
+			self.recentchanges[name] = RecentChangesAggregator(site, f"cache/recentchanges_{name}.pkl");
+			self.contributions[name] = ContributionsAggregator(site, f"cache/contributions_{name}.pkl");
+
+	def render(self, rows: typing.List[typing.Tuple[str, int]], unit: str):
+		return [
+			"\n".join(self.medals.get(rank if index == 0 else -1, "-") + f" **{user}**: `{count}` {unit}" for rank, (user, count) in enumerate(chunk))
+			for index, chunk in enumerate(chunk_list(rows, self.per_page))
+		];
+
+	async def _compute(self, source: str, site: str):
+		self.dirty.discard((source, site)); # every change seen so far is fetched below
+		pages = self.state["pages"];
+		if source == "recentchanges":
+			aggregator = self.recentchanges[site];
+			await aggregator.refresh();
+			now = time.time();
+			for period, length in self.periods.items():
+				since = now - length if length is not None else None;
+				edits, new_pages = aggregator.leaderboards(self.limit, since);
+				pages[("edits", site, period)] = self.render(edits, self.units["edits"]);
+				pages[("new_pages", site, period)] = self.render(new_pages, self.units["new_pages"]);
+				if length is not None:
+					contribs = aggregator.count(("edit", "new"), since).most_common(self.limit);
+					pages[("contribs", site, period)] = self.render(contribs, self.units["contribs"]);
+		else:
+			await self.contributions[site].refresh();
+			contribs = self.contributions[site].leaderboard(self.limit);
+			pages[("contribs", site, "all")] = self.render(contribs, self.units["contribs"]);
+
+		self.state["computed"][(source, site)] = time.time();
+		# other computations insert pages while this one writes, so pickle a snapshot here, on the loop
+		async with self.persisting:
+			data = pickle.dumps(self.state);
+			await asyncio.get_running_loop().run_in_executor(None, PickleCacheManager.write_cache, self.filename, data);
+
+	def refresh(self, source: str, site: str) -> asyncio.Future:
+		"""Recomputes one source's pages, sharing the computation with any refresh already running."""
+		return self.flights.start((source, site), lambda: self._compute(source, site), on_error=SingleFlight.report);
+
+	def stale(self, source: str, site: str):
+		computed = self.state["computed"].get((source, site), 0);
+		return (source, site) in self.dirty or time.time() - computed > self.max_age * self.refresh_ahead;
+
+	@staticmethod
+	def source(kind: str, period: str):
+		return "contributions" if kind == "contribs" and period == "all" else "recentchanges";
+
+	async def get(self, kind: str, site: str, period: str = "all") -> typing.List[str]:
+		source = self.source(kind, period);
+		if (pages := self.state["pages"].get((kind, site, period))) is None:
+			await asyncio.shield(self.refresh(source, site));
+			return self.state["pages"][(kind, site, period)];
+
+		if self.stale(source, site):
+			self.refresh(source, site);
+		return pages;
+
+	def on_change(self, change):
+		if change.kind in ("edit", "new"):
+			self.dirty.update({("recentchanges", change.site), ("contributions", change.site)});
+
+	async def run(self, interval: float = 60):
+		while True:
+			refreshes = [
+				self.refresh(source, site)
+				for source in ("recentchanges", "contributions") for site in self.sites
+				if self.stale(source, site)
+			];
+			await asyncio.gather(*refreshes, return_exceptions=True);
+			await asyncio.sleep(interval);
@@ -0,0 +1,154 @@
+import asyncio, json, typing;
+from collections import Counter;
+from pathlib import Path;
+from aiohttp import web;
+
+FIXTURES = Path(__file__).parent / "fixtures";
+
+class MockWiki:
+	"""A local stand-in for both sites' ``api.php`` that replays recorded responses.
+
+	Every site is served under ``/<site>/api.php``. Listings are paginated with the same
+	``continue`` blocks MediaWiki emits, ``latency`` seconds are added to every request,
+	and requests are counted per site and module.
+	"""
+
+	page_size = 50 # what "max" means here, small enough to exercise continuation
+
+	def __init__(self, latency: float = 0.0, fixtures: Path = FIXTURES):
+		self.latency = latency;
+		self.fixtures = {path.stem: json.loads(path.read_text()) for path in fixtures.glob("*.json")};
+		self.calls: typing.Counter[typing.Tuple[str, str]] = Counter();
+		self._runner: typing.Optional[web.AppRunner] = None;
+
+	@staticmethod
+	def module(params) -> str:
+		for key in ("generator", "list", "meta"):
+			if key in params:
+				return params[key];
+		return params.get("prop", params.get("action", "unknown"));
+
+	def limit(self, params, key: str, default: int = 10):
+		value = params.get(key, str(default));
+		return self.page_size if value == "max" else min(int(value), self.page_size);
+
+	def paginate(self, items: list, params, prefix: str, listname: str):
+		offset = int(params.get(f"{prefix}continue", 0));
+		limit = self.limit(params, f"{prefix}limit");
+		body: dict = {"batchcomplete": "", "query": {listname: items[offset:offset + limit]}};
+		if offset + limit < len(items):
+			body["continue"] = {f"{prefix}continue": str(offset + limit), "continue": "-||"};
+		return body;
+
+	def search(self, site: str, params):
+		titles = [title for title in self.fixtures["search"][site]["search"]];
+		offset = int(params.get("gsroffset", 0));
+		limit = self.limit(params, "gsrlimit");
+		pages = {};
+		for index, title in enumerate(titles[offset:offset + limit], start=offset + 1):
+			pages[str(1000 + index)] = {
+				"pageid": 1000 + index, "ns": 0, "title": title, "index": index,
+				"fullurl": f"https://{site}.example/wiki/{title.replace(' ', '_')}"
+			};
+
+		body: dict = {"batchcomplete": ""};
+		if pages:
+			body["query"] = {"pages": pages};
+		if offset + limit < len(titles):
+			body["continue"] = {"gsroffset": offset + limit, "continue": "gsroffset||"};
+		return body;
+
+	def recentchanges(self, site: str, params):
+		changes = self.fixtures["recentchanges"][site];
+		if params.get("rcdir") == "newer":
+			if "rcstart" in params:
+				changes = [change for change in changes if change["timestamp"] >= params["rcstart"]];
+		else:
+			changes = changes[::-1];
+		if "rctype" in params:
+			types = params["rctype"].split("|");
+			changes = [change for change in changes if change["type"] in types];
+		return self.paginate(changes, params, "rc", "recentchanges");
+
+	def allusers(self, site: str, params):
+		users = self.fixtures["allusers"][site];
+		if "auactiveusers" in params:
+			users = [user for user in users if user["active"]];
+		return self.paginate(users, params, "au", "allusers");
+
+	def usercontribs(self, site: str, params):
+		user = next((user for user in self.fixtures["allusers"][site] if user["name"] == params["ucuser"]), None);
+		contribs = [{"userid": user["userid"], "user": user["name"], "revid": revid} for revid in range(user["editcount"])] if user else [];
+		return self.paginate(contribs, params, "uc", "usercontribs");
+
+	def pages(self, site: str, params):
+		recorded = self.fixtures["pages"][site];
+		props = params.get("prop", "").split("|");
+		query: dict = {"pages": {}};
+
+		if "titles" in params:
+			targets = [(title, recorded.get(title)) for title in params["titles"].split("|")];
+		else:
+			ids = params.get("pageids", "").split("|");
+			targets = [(page["title"], page) for page in recorded.values() if str(page["pageid"]) in ids];
+
+		for index, (title, page) in enumerate(targets, start=1):
+			if page is None:
+				query["pages"][str(-index)] = {"ns": 0, "title": title, "missing": ""};
+				continue;
+
+			entry = {key: value for key, value in page.items() if key not in ("revisions", "creation", "extract")};
+			if "revisions" in props:
+				entry["revisions"] = [page["creation"]] if params.get("rvdir") == "newer" else page["revisions"];
+			if "extracts" in props:
+				entry["extract"] = page["extract"];
+			query["pages"][str(page["pageid"])] = entry;
+
+		if params.get("list") == "logevents":
+			page = recorded.get(params.get("letitle", ""));
+			query["logevents"] = [{
+				"logid": page["pageid"], "logpage": page["pageid"], "type": "create", "action": "create", "title": page["title"],
+				"user": page["creation"]["user"], "timestamp": page["creation"]["timestamp"]
+			}] if page else [];
+
+		return {"batchcomplete": "", "query": query};
+
+	async def handle(self, request: web.Request):
+		site, params = request.match_info["site"], request.query;
+		module = self.module(params);
+		self.calls[(site, module)] += 1;
+		if self.latency:
+			await asyncio.sleep(self.latency);
+
+		if site not in self.fixtures["siteinfo"]:
+			return web.json_response({"error": {"code": "badsite", "info": f"Unknown site {site}"}});
+		elif module == "search":
+			body = self.search(site, params);
+		elif module == "siteinfo":
+			body = self.fixtures["siteinfo"][site];
+		elif module == "recentchanges":
+			body = self.recentchanges(site, params);
+		elif module == "allusers":
+			body = self.allusers(site, params);
+		elif module == "usercontribs":
+			body = self.usercontribs(site, params);
+		elif module == "allpages":
+			body = self.paginate(self.fixtures["allpages"][site]["allpages"], params, "ap", "allpages");
+		elif "titles" in params or "pageids" in params:
+			body = self.pages(site, params);
+		else:
+			body = {"error": {"code": "unsupported", "info": f"No recording for {dict(params)}"}};
+		return web.json_response(body);
+
+	async def start(self, host: str = "127.0.0.1", port: int = 0):
+		app = web.Application();
+		app.router.add_get("/{site}/api.php", self.handle);
+		self._runner = web.AppRunner(app);
+		await self._runner.setup();
+		site = web.TCPSite(self._runner, host, port);
+		await site.start();
+		return site._server.sockets[0].getsockname()[1];
+
+	async def stop(self):
+		if self._runner is not None:
+			await self._runner.cleanup();
@@ -0,0 +1,157 @@
+"""Offline command benchmarks against a local MediaWiki API stand-in.
+
+Usage: python -m benchmarks.run [--iterations N] [--latency MS] [--cold] [--only NAME ...]
+"""
+import argparse, asyncio, os, shutil, statistics, sys, tempfile, time, types, typing;
+from collections import Counter;
+from pathlib import Path;
+
+ROOT = Path(__file__).resolve().parent.parent;
+sys.path.insert(0, str(ROOT));
+
+import discord;
+from bot import SDWikiBot, Sites;
+from mediawiki import AsyncSite;
+from benchmarks.mockwiki import MockWiki;
+
+class FakeMessage:
+	def __init__(self, content: str = "", guild_id: int = 1):
+		self.content = content;
+		self.author = types.SimpleNamespace(id=2, bot=False);
+		self.guild = types.SimpleNamespace(id=guild_id, name="Benchmark", icon=None);
+		self.edits: typing.List[dict] = [];
+
+	async def edit(self, **kwargs):
+		self.edits.append(kwargs);
+		return self;
+
+	async def reply(self, *args, **kwargs):
+		return FakeMessage();
+
+class FakeResponse:
+	async def defer(self, **kwargs):
+		pass;
+
+	def is_done(self):
+		return True;
+
+class FakeFollowup:
+	async def send(self, *args, **kwargs):
+		return FakeMessage();
+
+class FakeInteraction:
+	def __init__(self, guild_id: int = 1):
+		self.user = types.SimpleNamespace(id=2, mention="<@2>");
+		self.guild = types.SimpleNamespace(id=guild_id, name="Benchmark", icon=None);
+		self.response = FakeResponse();
+		self.followup = FakeFollowup();
+
+class Harness:
+	def __init__(self, mock: MockWiki, port: int):
+		self.mock = mock;
+		self.bot = SDWikiBot(
+			"benchmark!",
+			sites=Sites(
+				wiki=AsyncSite(f"127.0.0.1:{port}", path="/wiki/", scheme="http"),
+				archives=AsyncSite(f"127.0.0.1:{port}", path="/archives/", scheme="http")
+			),
+			intents=discord.Intents.none()
+		);
+		self.bot._connection.user = types.SimpleNamespace(id=1, mention="<@1>", avatar=None);
+		self.bot.leaderboards.load();
+
+		from cogs.events import EventsCog;
+		from cogs.leaderboards import LeaderboardsCog;
+		from cogs.search import SearchCog;
+		from cogs.stats import StatsCog;
+		from cogs.wiki import WikiCog;
+		self.events = EventsCog(self.bot);
+		self.leaderboards = LeaderboardsCog(self.bot);
+		self.search = SearchCog(self.bot);
+		self.stats = StatsCog(self.bot);
+		self.wiki = WikiCog(self.bot);
+
+		self.bot.set_guild_setting(1, "toggle_smart_referencing", True);
+		self.page = next(iter(mock.fixtures["pages"]["wiki"]));
+
+	def reset(self):
+		"""Drops every cache so the next command runs cold."""
+		self.bot.results.clear();
+		self.bot.summaries.clear();
+		self.bot.statistics.snapshots.clear();
+		leaderboards = self.bot.leaderboards;
+		leaderboards.state.update(pages={}, computed={});
+		for aggregator in leaderboards.recentchanges.values():
+			aggregator.reset();
+		for aggregator in leaderboards.contributions.values():
+			aggregator.state.update(swept=0, contribs=Counter());
+
+	def scenarios(self) -> typing.Dict[str, typing.Callable[[], typing.Awaitable]]:
+		return {
+			"search": lambda: type(self.search).search.callback(self.search, FakeInteraction(), "Court", "both", "title"),
+			"pageinfo": lambda: type(self.wiki).pageinfo.callback(self.wiki, FakeInteraction(), self.page),
+			"leaderboards edits": lambda: type(self.leaderboards).edits.callback(self.leaderboards, FakeInteraction(), "wiki"),
+			"leaderboards new_pages": lambda: type(self.leaderboards).new_pages.callback(self.leaderboards, FakeInteraction(), "wiki"),
+			"leaderboards contribs": lambda: type(self.leaderboards).contribs.callback(self.leaderboards, FakeInteraction(), "wiki"),
+			"stats wiki": lambda: type(self.stats).wiki.callback(self.stats, FakeInteraction()),
+			"smart referencing": lambda: self.events.on_message(FakeMessage(f"see [[{self.page}]], [[Court]] and [[Senate Act]]")),
+		};
+
+	async def measure(self, name: str, run: typing.Callable[[], typing.Awaitable], iterations: int, cold: bool):
+		latencies, calls = [], [];
+		for _ in range(iterations):
+			if cold:
+				self.reset();
+			before = sum(self.mock.calls.values());
+			start = time.perf_counter();
+			await run();
+			latencies.append((time.perf_counter() - start) * 1000);
+			calls.append(sum(self.mock.calls.values()) - before);
+
+		latencies.sort();
+		return {
+			"name": name,
+			"p50": statistics.median(latencies),
+			"p99": latencies[min(len(latencies) - 1, round(0.99 * (len(latencies) - 1)))],
+			"calls": sum(calls) / len(calls)
+		};
+
+async def main(args):
+	mock = MockWiki(latency=args.latency / 1000);
+	port = await mock.start();
+	harness = Harness(mock, port);
+	try:
+		results = [];
+		for name, run in harness.scenarios().items():
+			if not args.only or name in args.only:
+				results.append(await harness.measure(name, run, args.iterations, args.cold));
+
+		for index in harness.bot.title_indexes.values():
+			await index.build();
+		if not args.only or "smart referencing (index)" in args.only:
+			results.append(await harness.measure("smart referencing (index)", harness.scenarios()["smart referencing"], args.iterations, args.cold));
+
+		print(f"{'command':<28}{'p50 ms':>10}{'p99 ms':>10}{'API calls':>12}");
+		for result in results:
+			print(f"{result['name']:<28}{result['p50']:>10.2f}{result['p99']:>10.2f}{result['calls']:>12.1f}");
+	finally:
+		harness.bot.settings.close();
+		await harness.bot.sites.close();
+		await mock.stop();
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0]);
+	parser.add_argument("--iterations", type=int, default=20);
+	parser.add_argument("--latency", type=float, default=0, help="Latency injected into every API request, in milliseconds.");
+	parser.add_argument("--cold", action="store_true", help="Drop every cache before each iteration.");
+	parser.add_argument("--only", nargs="*", help="Only run the named commands.");
+	args = parser.parse_args();
+
+	# the bot keeps its settings and caches relative to the working directory
+	workdir = tempfile.mkdtemp(prefix="sdwikibot-bench-");
+	shutil.copy(ROOT / "settings.json", workdir);
+	os.chdir(workdir);
+	try:
+		asyncio.run(main(args));
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True);
@@ -1,23 +1,88 @@
-import asyncio, os, time, discord, mwclient, json;
-from dataclasses import dataclass;
+import asyncio, os, time, discord, json, typing;
+from dataclasses import dataclass, fields;
 from discord.ext.commands import Bot, ExtensionError;
+from concurrent.futures import ThreadPoolExecutor;
 from pathlib import Path;
-from cache import PickleCacheManager;
+from aggregators import Leaderboards;
+from cache import HTTPCache, ResultCache;
+from metrics import metrics;
+from mirror import SearchMirror;
+from diagnostics import Diagnostics, gc_collections, resident_memory;
+from mediawiki import AsyncSite;
+from titleindex import TitleIndex;
+from siteinfo import SiteStatistics;
+from changes import ChangeBus, Change, RecentChangesPoller;
+from store import SettingsStore;
+from watcher import CogWatcher;
+
+def relocate_database(old: str, new: str):
+    """Moves a SQLite database, with its WAL files, from where an earlier version kept it."""
+    if os.path.exists(old) and not os.path.exists(new):
+        os.makedirs(os.path.dirname(new) or ".", exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(old + suffix):
+                os.replace(old + suffix, new + suffix)
 
 @dataclass
 class Sites:
-    wiki: mwclient.Site
-    archives: mwclient.Site
+    wiki: AsyncSite
+    archives: AsyncSite
+
+    def __iter__(self):
+        return iter([(field.name, getattr(self, field.name)) for field in fields(self)])
+
+    def get(self, name: str) -> AsyncSite:
+        return getattr(self, name)
+
+    async def close(self):
+        await asyncio.gather(*(site.close() for _, site in self))
 
 class SDWikiBot(Bot):
-    watcher: asyncio.Task
+    watcher: typing.Optional[asyncio.Task] = None
+    settings_writer: asyncio.Task
+    settings_warmer: asyncio.Task
 
-    def __init__(self, *args, sites: Sites, tm, **kwargs):
+    def __init__(self, *args, sites: Sites, **kwargs):
         super().__init__(*args, **kwargs)
         self.sites = sites
-        self.tm = tm
+        self.results = ResultCache()
+        self.summaries = ResultCache(maxsize=4096)
+        self.http_cache = HTTPCache("cache/http.db")
+        for _, site in sites:
+            site.cache = self.results
+            site.http_cache = self.http_cache
+        self.title_indexes = {name: TitleIndex(site) for name, site in sites}
+        self.changes = ChangeBus()
+        self.pollers = [
+            RecentChangesPoller(name, site, self.changes, f"cache/poller_{name}.pkl")
+            for name, site in sites
+        ]
+        self.changes.subscribe(self.invalidate_results)
+        self.changes.subscribe(lambda change: self.title_indexes[change.site].apply(change.raw or {}))
+        self.statistics = SiteStatistics(sites)
+        self.leaderboards = Leaderboards(sites)
+        self.changes.subscribe(self.leaderboards.on_change)
+        relocate_database("mirror.db", "cache/mirror.db")
+        self.mirror = SearchMirror(sites) if os.getenv("SEARCH_MIRROR", "").lower() in ("1", "true", "yes") else None
+        if self.mirror is not None:
+            self.changes.subscribe(self.mirror.on_change)
+        self.background: typing.List[asyncio.Task] = []
+        self.executor = ThreadPoolExecutor(thread_name_prefix="sdwikibot")
+        self.metrics = metrics
+        self.register_metrics()
+        self.diagnostics = Diagnostics()
+        self.schema: dict = json.load(open("settings.json", "rb"))
+        relocate_database("settings.db", "cache/settings.db")
+        self.settings = SettingsStore("cache/settings.db", defaults={
+            item["name"]: item.get("default", None)
+            for items in self.schema.values() for item in items
+        })
 
     async def setup_hook(self):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(self.executor)
+        await loop.run_in_executor(None, self.leaderboards.load)
+
         for cog in Path("cogs").glob("*.py"):
             if not cog.stem.startswith("_"):
                 try:
@@ -26,6 +91,27 @@ class SDWikiBot(Bot):
                 except Exception as e:
                     print(f"[CLIENT] Failed to load cog {cog.name}: {e}")
 
+        await self.sync_tree()
+
+        if (imported := await loop.run_in_executor(None, self.settings.import_pickles, "./settings/")):
+            print(f"[CLIENT] Imported legacy settings for {imported} guild(s)")
+        self.settings_writer = asyncio.create_task(self.settings.run())
+        self.settings_warmer = asyncio.create_task(self.settings.warm())
+        self.background = [asyncio.create_task(index.maintain()) for index in self.title_indexes.values()]
+        self.background.append(asyncio.create_task(self.statistics.run()))
+        self.background.append(asyncio.create_task(self.leaderboards.run()))
+        if self.mirror is not None:
+            self.background.append(asyncio.create_task(self.mirror.run()))
+        self.background.extend(asyncio.create_task(poller.run()) for poller in self.pollers)
+        self.background.append(asyncio.create_task(self.metrics.monitor_loop()))
+        if (port := os.getenv("METRICS_PORT")):
+            self.background.append(asyncio.create_task(self.metrics.serve(port=int(port))))
+        if os.getenv("PRODUCTION", "").lower() in ("1", "true", "yes"):
+            print("[WATCHER] Production mode, cog watcher disabled")
+        else:
+            self.watcher = asyncio.create_task(self.cog_watcher())
+
+    async def sync_tree(self):
         testing_guild_id = os.getenv("TESTING_GUILD_ID", None);
         if testing_guild_id:
             guild = discord.Object(id=testing_guild_id)
@@ -37,49 +123,98 @@ class SDWikiBot(Bot):
         else:
             await self.tree.sync();
 
-        await self.ensure_settings();
-        self.watcher = asyncio.create_task(self.cog_watcher())
-
-    def _return_settings(self, d={}):
-        settings: dict = json.load(open("settings.json", "rb"))
-        for _list in settings.values():
-            for item in _list:
-                if item["name"] not in d:
-                    d[item["name"]] = item.get("default", None);
-        return (settings, d);
-
-    async def ensure_settings(self):
-        if not os.path.exists("./settings/"):
-            os.mkdir("./settings/");
+    def register_metrics(self):
+        caches = {"results": self.results, "summaries": self.summaries}
+        self.metrics.register(
+            "sdwikibot_cache_hits_total", "Lookups answered by a result cache.",
+            lambda: [({"cache": name}, cache.hits) for name, cache in caches.items()], kind="counter"
+        )
+        self.metrics.register(
+            "sdwikibot_cache_misses_total", "Lookups a result cache could not answer.",
+            lambda: [({"cache": name}, cache.misses) for name, cache in caches.items()], kind="counter"
+        )
+        self.metrics.register(
+            "sdwikibot_cache_entries", "Entries held by a result cache.",
+            lambda: [({"cache": name}, len(cache)) for name, cache in caches.items()]
+        )
+        self.metrics.register(
+            "sdwikibot_http_cache_requests_total", "API requests by how the on-disk HTTP cache answered them.",
+            lambda: [
+                ({"result": "hit"}, self.http_cache.hits),
+                ({"result": "revalidated"}, self.http_cache.revalidated),
+                ({"result": "miss"}, self.http_cache.misses)
+            ], kind="counter"
+        )
+        self.metrics.register(
+            "sdwikibot_http_cache_bytes", "Compressed bytes held by the on-disk HTTP cache.",
+            lambda: [({}, self.http_cache.size)]
+        )
+        self.metrics.register(
+            "sdwikibot_executor_queue_depth", "Jobs waiting for a thread in the default executor.",
+            lambda: [({}, self.executor._work_queue.qsize())]
+        )
+        self.metrics.register(
+            "process_resident_memory_bytes", "Resident memory size in bytes.",
+            lambda: [({}, resident_memory())]
+        )
+        self.metrics.register(
+            "python_gc_collections_total", "Garbage collector runs, by generation.",
+            lambda: [({"generation": str(generation)}, count) for generation, count in enumerate(gc_collections())], kind="counter"
+        )
 
-        async for guild in self.fetch_guilds():
-            db = PickleCacheManager.get_cache(f"settings/{guild.id}.pkl");
-            settings, db = self._return_settings(db);
-            db["metadata"] = settings;
-            PickleCacheManager.sync_cache(f"settings/{guild.id}.pkl");
+    def invalidate_results(self, change: Change):
+        api_url = self.sites.get(change.site).api_url
+        for title in filter(None, (change.title, change.target)):
+            self.results.invalidate((api_url, "title", title))
+        self.results.invalidate((api_url, "search", "text"))
+        if change.kind != "edit":
+            self.results.invalidate((api_url, "search", "title"))
 
-    def get_guild_settings(self, _id: int):
-        return PickleCacheManager.get_cache(f"settings/{_id}.pkl");
+    async def get_guild_settings(self, _id: int):
+        return await self.settings.get(_id);
 
-    def sync_guild_settings(self, _id: int):
-        PickleCacheManager.sync_cache(f"settings/{_id}.pkl");
+    def set_guild_setting(self, _id: int, key: str, value):
+        self.settings.set(_id, key, value);
 
     async def cog_watcher(self):
-        print("[WATCHER] Watching for changes...")
-        last = time.time()
-        while True:
-            reloads = {
-                name for name, module in self.extensions.items()
-                if module.__file__ and os.stat(module.__file__).st_mtime > last
-            }
-            for ext in reloads:
+        async for changes in CogWatcher("cogs").changes():
+            added = False
+            for path in sorted(changes):
+                ext = ".".join(path.with_suffix("").parts)
+                if path.stem.startswith("_") or not path.exists():
+                    continue
                 try:
-                    await self.reload_extension(ext)
-                    print(f"[WATCHER] Hot reloaded {ext}")
+                    if ext in self.extensions:
+                        await self.reload_extension(ext)
+                        print(f"[WATCHER] Hot reloaded {ext}")
+                    else:
+                        await self.load_extension(ext)
+                        added = True
+                        print(f"[WATCHER] Loaded new cog {ext}")
                 except ExtensionError as e:
                     print(f"[WATCHER] Could not hot reload {ext}: {e}")
-            last = time.time()
-            await asyncio.sleep(1)
+
+            if added:
+                await self.sync_tree()
+
+    async def close(self):
+        for task in self.background:
+            task.cancel()
+        if self.watcher:
+            self.watcher.cancel()
+        if hasattr(self, "settings_writer"):
+            self.settings_writer.cancel()
+            self.settings_warmer.cancel()
+        self.settings.close()
+        if self.mirror is not None:
+            self.mirror.close()
+        await super().close()
+        await self.sites.close()
+        self.http_cache.close()
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        self.metrics.observe("command", command.qualified_name, elapsed)
 
     async def on_ready(self):
         self.start_time = time.time()
@@ -1,18 +1,20 @@
-import os, pickle, threading
+import asyncio, functools, os, pickle, sqlite3, threading, time, traceback, typing, zlib;
+from collections import OrderedDict;
+from email.utils import parsedate_to_datetime;
 
 class PickleCacheManager:
 	_cache = {}
 	_locks = {}
 
 	@classmethod
-	def get_cache(cls, filename, default={}):
+	def get_cache(cls, filename, default=None):
 		if filename not in cls._cache:
 			cls._locks[filename] = threading.Lock();
 			if os.path.exists(filename):
 				with open(filename, "rb") as f:
 					cls._cache[filename] = pickle.load(f);
 			else:
-				cls._cache[filename] = default;
+				cls._cache[filename] = {} if default is None else default;
 		return cls._cache[filename];
 
 	@classmethod
@@ -21,8 +23,22 @@ class PickleCacheManager:
 			return False;
 
 		with cls._locks[filename]:
-			with open(filename, 'wb') as f:
+			with open(filename + ".tmp", 'wb') as f:
 				pickle.dump(cls._cache[filename], f);
+			os.replace(filename + ".tmp", filename);
+
+		return True;
+
+	@classmethod
+	def write_cache(cls, filename, data: bytes):
+		"""Writes an already pickled cache; pickle it on the thread that mutates it, write it anywhere."""
+		if filename not in cls._locks:
+			return False;
+
+		with cls._locks[filename]:
+			with open(filename + ".tmp", 'wb') as f:
+				f.write(data);
+			os.replace(filename + ".tmp", filename);
 
 		return True;
 
@@ -30,4 +46,275 @@ class PickleCacheManager:
 	def close_cache(cls, filename):
 		cls.sync_cache(filename);
 		del cls._cache[filename];
-		del cls._locks[filename];
\ No newline at end of file
+		del cls._locks[filename];
+
+class ResultCache:
+	"""A bounded TTL + LRU cache for API results, shared by every site and cog.
+
+	Entries are keyed by site, action and normalized parameters. Answers that carry
+	no results are kept for ``negative_ttl`` instead of the caller's TTL. Entries may
+	carry tags, so that everything tagged with e.g. a page title can be invalidated at once.
+	"""
+
+	_missing = object()
+
+	def __init__(self, maxsize=2048, negative_ttl=60):
+		self.maxsize = maxsize;
+		self.negative_ttl = negative_ttl;
+		self.hits = 0;
+		self.misses = 0;
+		self._entries: OrderedDict = OrderedDict();
+		self._tags: dict = {};
+
+	@staticmethod
+	def make_key(site, action, params):
+		normalized = [];
+		for name, value in sorted(params.items()):
+			value = " ".join(str(value).split());
+			if name.endswith("search"):
+				value = value.casefold();
+			normalized.append((name, value));
+		return (site, action, tuple(normalized));
+
+	def get(self, key, default=None):
+		entry = self._entries.get(key, self._missing);
+		if entry is not self._missing and entry[0] > time.monotonic():
+			self._entries.move_to_end(key);
+			self.hits += 1;
+			return entry[1];
+
+		if entry is not self._missing:
+			self._discard(key);
+		self.misses += 1;
+		return default;
+
+	def set(self, key, value, ttl, negative=False, tags=()):
+		self._discard(key);
+		self._entries[key] = (time.monotonic() + (min(ttl, self.negative_ttl) if negative else ttl), value, tuple(tags));
+		for tag in tags:
+			self._tags.setdefault(tag, set()).add(key);
+		while len(self._entries) > self.maxsize:
+			self._discard(next(iter(self._entries)));
+
+	def _discard(self, key):
+		entry = self._entries.pop(key, None);
+		if entry is None:
+			return;
+		for tag in entry[2]:
+			if (keys := self._tags.get(tag)) is not None:
+				keys.discard(key);
+				if not keys:
+					del self._tags[tag];
+
+	def invalidate(self, tag):
+		keys = self._tags.pop(tag, ());
+		for key in list(keys):
+			self._discard(key);
+		return len(keys);
+
+	def clear(self):
+		self._entries.clear();
+		self._tags.clear();
+
+	def __len__(self):
+		return len(self._entries);
+
+	@property
+	def hit_ratio(self):
+		total = self.hits + self.misses;
+		return self.hits / total if total else 0.0;
+
+class SingleFlight:
+	"""Coalesces concurrent calls for the same key into a single in-flight computation.
+
+	Callers arriving while a computation for their key is running await that one and share
+	its result or exception. Nothing is remembered once it finishes; caching is up to the caller.
+	"""
+
+	def __init__(self):
+		self._calls: typing.Dict[typing.Hashable, asyncio.Future] = {};
+
+	def start(self, key, factory: typing.Callable[[], typing.Awaitable], on_error: typing.Optional[typing.Callable[[BaseException], typing.Any]] = None) -> asyncio.Future:
+		"""Returns the computation in flight for ``key``, starting ``factory()`` if there is none.
+
+		``on_error`` is called once with the exception of a computation this call started,
+		however many callers shared it, so nobody has to await a background refresh to see it fail.
+		"""
+		if (future := self._calls.get(key)) is None:
+			future = self._calls[key] = asyncio.ensure_future(factory());
+			future.add_done_callback(functools.partial(self._forget, key));
+			if on_error is not None:
+				future.add_done_callback(functools.partial(self._failed, on_error));
+		return future;
+
+	@staticmethod
+	def report(e: BaseException):
+		traceback.print_exception(type(e), e, e.__traceback__);
+
+	async def do(self, key, factory: typing.Callable[[], typing.Awaitable]):
+		# shielded, so a caller giving up does not cancel the computation for everyone else
+		return await asyncio.shield(self.start(key, factory));
+
+	def cancel(self):
+		for future in list(self._calls.values()):
+			future.cancel();
+
+	@staticmethod
+	def _failed(on_error, future: asyncio.Future):
+		if not future.cancelled() and (e := future.exception()) is not None:
+			on_error(e);
+
+	def _forget(self, key, future: asyncio.Future):
+		if self._calls.get(key) is future:
+			del self._calls[key];
+
+	def __contains__(self, key):
+		return key in self._calls;
+
+	def __len__(self):
+		return len(self._calls);
+
+class HTTPCache:
+	"""A size-bounded on-disk cache of HTTP response bodies, kept in SQLite across restarts.
+
+	Freshness comes only from the server: ``Cache-Control: max-age`` (less ``Age``) or
+	``Expires``. Responses marked ``no-store`` are never kept. Stale entries are kept as
+	long as they carry an ``ETag`` or ``Last-Modified``, so the next request can be made
+	conditional and a ``304`` answered from disk. Every entry's validators and expiry are
+	held in memory, so a lookup that misses never touches the disk. Bodies are stored
+	compressed, and the least recently used are evicted once ``max_bytes`` is exceeded.
+	Disk access is blocking; run ``body``, ``store`` and ``revalidate`` in an executor.
+	"""
+
+	class Entry(typing.NamedTuple):
+		etag: typing.Optional[str]
+		last_modified: typing.Optional[str]
+		expires: float
+		size: int
+
+	def __init__(self, filename: str = "cache/http.db", max_bytes: int = 64 * 1024 * 1024):
+		self.max_bytes = max_bytes;
+		self.hits = 0;
+		self.revalidated = 0;
+		self.misses = 0;
+		self._lock = threading.Lock();
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self._conn = sqlite3.connect(filename, check_same_thread=False);
+		self._conn.execute("PRAGMA journal_mode=WAL");
+		self._conn.execute("PRAGMA synchronous=NORMAL");
+		self._conn.execute("""
+			CREATE TABLE IF NOT EXISTS responses (
+				key TEXT PRIMARY KEY,
+				etag TEXT,
+				last_modified TEXT,
+				expires REAL NOT NULL,
+				used REAL NOT NULL,
+				size INTEGER NOT NULL,
+				body BLOB NOT NULL
+			)
+		""");
+		self._conn.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)");
+		self._conn.commit();
+
+		self._entries: typing.Dict[str, HTTPCache.Entry] = {
+			key: self.Entry(etag, last_modified, expires, size)
+			for key, etag, last_modified, expires, size in self._conn.execute("SELECT key, etag, last_modified, expires, size FROM responses")
+		};
+		self.size = sum(entry.size for entry in self._entries.values());
+
+	@staticmethod
+	def policy(headers) -> typing.Tuple[bool, float]:
+		"""Reads ``(storable, expires)`` from response headers; ``expires`` is a UNIX timestamp."""
+		directives = {};
+		for directive in headers.get("Cache-Control", "").split(","):
+			name, _, value = directive.strip().partition("=");
+			directives[name.lower()] = value.strip('"');
+
+		if "no-store" in directives:
+			return False, 0.0;
+		if "no-cache" in directives:
+			return True, 0.0;
+		if directives.get("max-age", "").isdigit():
+			age = int(headers.get("Age", "0")) if headers.get("Age", "").isdigit() else 0;
+			return True, time.time() + int(directives["max-age"]) - age;
+		if (expires := headers.get("Expires")):
+			try:
+				return True, parsedate_to_datetime(expires).timestamp();
+			except (TypeError, ValueError):
+				return True, 0.0; # an invalid Expires means already expired
+		return True, 0.0;
+
+	def lookup(self, key: str) -> typing.Optional["HTTPCache.Entry"]:
+		return self._entries.get(key);
+
+	def conditional_headers(self, entry: "HTTPCache.Entry") -> dict:
+		headers = {};
+		if entry.etag:
+			headers["If-None-Match"] = entry.etag;
+		if entry.last_modified:
+			headers["If-Modified-Since"] = entry.last_modified;
+		return headers;
+
+	def body(self, key: str) -> typing.Optional[bytes]:
+		with self._lock:
+			row = self._conn.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone();
+			if row is None:
+				self._forget(key);
+				return None;
+			with self._conn:
+				self._conn.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key));
+		return zlib.decompress(row[0]);
+
+	def store(self, key: str, body: bytes, headers) -> bool:
+		storable, expires = self.policy(headers);
+		etag, last_modified = headers.get("ETag"), headers.get("Last-Modified");
+		if not storable or (expires <= time.time() and not etag and not last_modified):
+			return False;
+
+		compressed = zlib.compress(body, 1);
+		if len(compressed) > self.max_bytes:
+			return False;
+
+		with self._lock, self._conn:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO responses (key, etag, last_modified, expires, used, size, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+				(key, etag, last_modified, expires, time.time(), len(compressed), compressed)
+			);
+			self._forget(key);
+			self._entries[key] = self.Entry(etag, last_modified, expires, len(compressed));
+			self.size += len(compressed);
+			self._evict();
+		return True;
+
+	def revalidate(self, key: str, headers) -> typing.Optional[bytes]:
+		"""Handles a ``304``: extends the entry's freshness from ``headers`` and returns its stored body."""
+		_, expires = self.policy(headers);
+		with self._lock:
+			with self._conn:
+				self._conn.execute("UPDATE responses SET expires = ? WHERE key = ?", (expires, key));
+			if (entry := self._entries.get(key)) is not None:
+				self._entries[key] = entry._replace(expires=expires);
+		return self.body(key);
+
+	def _forget(self, key: str):
+		if (entry := self._entries.pop(key, None)) is not None:
+			self.size -= entry.size;
+
+	def _evict(self):
+		while self.size > self.max_bytes and self._entries:
+			rows = self._conn.execute("SELECT key FROM responses ORDER BY used LIMIT 64").fetchall();
+			if not rows:
+				break;
+			for key, in rows:
+				self._conn.execute("DELETE FROM responses WHERE key = ?", (key,));
+				self._forget(key);
+				if self.size <= self.max_bytes:
+					break;
+
+	def __len__(self):
+		return len(self._entries);
+
+	def close(self):
+		with self._lock:
+			self._conn.close();
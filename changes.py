@@ -0,0 +1,111 @@
+import asyncio, os, time, traceback, typing;
+from dataclasses import dataclass;
+from cache import PickleCacheManager;
+from mediawiki import AsyncSite;
+
+@dataclass
+class Change:
+	site: str
+	kind: str # edit, new, move, delete, restore or log
+	title: str
+	namespace: int
+	rcid: int
+	timestamp: str
+	user: typing.Optional[str] = None
+	target: typing.Optional[str] = None
+	raw: typing.Optional[dict] = None
+
+	@classmethod
+	def from_recentchange(cls, site: str, change: dict):
+		kind = change.get("type", "edit");
+		target = None;
+		if kind == "log":
+			logtype, logaction = change.get("logtype"), change.get("logaction");
+			if logtype == "move":
+				kind, target = "move", change.get("logparams", {}).get("target_title");
+			elif logtype == "delete" and logaction in ("delete", "restore"):
+				kind = logaction;
+
+		return cls(
+			site=site,
+			kind=kind,
+			title=change.get("title", ""),
+			namespace=change.get("ns", 0),
+			rcid=change.get("rcid", 0),
+			timestamp=change.get("timestamp", ""),
+			user=change.get("user"),
+			target=target,
+			raw=change
+		);
+
+class ChangeBus:
+	"""Delivers change events to every subscriber, in order, on the event loop."""
+
+	def __init__(self):
+		self._subscribers: typing.List[typing.Callable[[Change], typing.Any]] = [];
+
+	def subscribe(self, callback: typing.Callable[[Change], typing.Any]):
+		self._subscribers.append(callback);
+		return lambda: self._subscribers.remove(callback) if callback in self._subscribers else None;
+
+	def publish(self, change: Change):
+		for callback in list(self._subscribers):
+			try:
+				callback(change);
+			except Exception as e:
+				traceback.print_exception(type(e), e, e.__traceback__);
+
+class RecentChangesPoller:
+	"""Tails a site's ``list=recentchanges`` from a saved cursor and publishes each change on a bus.
+
+	A poller without a saved cursor starts from the present; it exists to report what
+	changes from now on, not to replay history.
+	"""
+
+	def __init__(self, name: str, site: AsyncSite, bus: ChangeBus, filename: str, interval: float = 30):
+		self.name = name;
+		self.site = site;
+		self.bus = bus;
+		self.filename = filename;
+		self.interval = interval;
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self.state = PickleCacheManager.get_cache(filename, default={"rcid": 0, "timestamp": None});
+
+	async def poll(self):
+		if self.state["timestamp"] is None:
+			self.state["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime());
+
+		params = {
+			"list": "recentchanges",
+			"rcprop": "ids|title|user|timestamp|loginfo",
+			"rctype": "edit|new|log",
+			"rcdir": "newer",
+			"rclimit": "max",
+			"rcstart": self.state["timestamp"]
+		};
+
+		published = 0;
+		async for query in self.site.query(**params):
+			for change in query.get("recentchanges", []):
+				if change.get("rcid", 0) <= self.state["rcid"]:
+					continue;
+
+				self.bus.publish(Change.from_recentchange(self.name, change));
+				self.state["rcid"] = change["rcid"];
+				self.state["timestamp"] = change.get("timestamp", self.state["timestamp"]);
+				published += 1;
+
+		if published:
+			await asyncio.get_running_loop().run_in_executor(None, PickleCacheManager.sync_cache, self.filename);
+		return published;
+
+	async def run(self):
+		while True:
+			try:
+				await self.poll();
+			except asyncio.CancelledError:
+				raise;
+			except Exception as e:
+				traceback.print_exception(type(e), e, e.__traceback__);
+			await asyncio.sleep(self.interval);
@@ -1,22 +1,101 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
 from discord.ext.commands import Cog
 from bot import SDWikiBot
-from constants import neutral_colour
+from mediawiki import AsyncSite
+from metrics import metrics
+from constants import cache_duration, neutral_colour
 from difflib import get_close_matches
-import discord, re, types, traceback, textwrap, asyncio
+import discord, re, traceback, textwrap, asyncio, typing
+
+reference_pattern = re.compile(r"\[\[(.+?)\]\]")
+
+class MessageSettings:
+	"""The settings on_message needs, precomputed once per settings change."""
+	__slots__ = ("help_on_mention", "toggle_smart_referencing", "prefix", "url_format", "view_related_items")
+
+	def __init__(self, settings: dict):
+		self.help_on_mention = settings.get("help_on_mention")
+		self.toggle_smart_referencing = settings.get("toggle_smart_referencing")
+		prefix = settings.get("link_prefix_message")
+		self.prefix = prefix if prefix and prefix != "None" else ""
+		self.url_format = "<%s>" if settings.get("silence_link_embeds") else "%s"
+		self.view_related_items = settings.get("view_related_items")
 
 class EventsCog(Cog):
 	def __init__(self, bot: SDWikiBot):
 		self.bot = bot
 		self.owner = None # prevent calling application info many times
+		self.cache_duration = cache_duration
+		self.site_limits = {name: asyncio.Semaphore(8) for name, _ in self.bot.sites} # in-flight searches per site
+		self.guild_limits: typing.Dict[int, asyncio.Semaphore] = {} # in-flight queries per guild, kept while in use
+		self.guild_users: typing.Counter[int] = Counter() # queries holding or waiting on each guild's semaphore
+
+	def resolve_locally(self, query: str):
+		indexes = self.bot.title_indexes
+		if not all(index.ready for index in indexes.values()):
+			return None
+
+		candidates = {title for index in indexes.values() for title in index.candidates(query)}
+		closest_titles = get_close_matches(query, candidates, n=7, cutoff=0.5)
+		if not closest_titles:
+			return None
+
+		titles_map = defaultdict(list)
+		for title in closest_titles:
+			for name, index in indexes.items():
+				if title in index.titles:
+					titles_map[title].append((name, index.site.page_url(title)))
+		return titles_map
+
+	async def resolve_remotely(self, query: str):
+		props = {
+			"generator": "search",
+			"gsrsearch": query,
+			"gsrwhat": "title",
+			"gsrlimit": 25,
+			"prop": "info",
+			"inprop": "url",
+		}
+
+		async def fetch(name: str, site: AsyncSite):
+			async with self.site_limits[name]:
+				return await site.get("query", ttl=self.cache_duration, **props)
+
+		names = [name for name, _ in self.bot.sites]
+		results = await asyncio.gather(*(fetch(name, site) for name, site in self.bot.sites))
+
+		titles_map = defaultdict(list)
+		for name, result_group in zip(names, results):
+			for result in result_group.get("query", {}).get("pages", {}).values():
+				titles_map[result["title"]].append((name, result["fullurl"]))
+		return titles_map
+
+	async def resolve(self, guild_id: int, query: str):
+		titles_map = self.resolve_locally(query)
+		if titles_map is None:
+			if (limit := self.guild_limits.get(guild_id)) is None:
+				limit = self.guild_limits[guild_id] = asyncio.Semaphore(4)
+			self.guild_users[guild_id] += 1
+			try:
+				async with limit:
+					titles_map = await self.resolve_remotely(query)
+			finally:
+				self.guild_users[guild_id] -= 1
+				if not self.guild_users[guild_id]:
+					del self.guild_users[guild_id], self.guild_limits[guild_id]
+		return titles_map
 
 	@Cog.listener()
 	async def on_message(self, message: discord.Message):
-		if message.author.bot or not message.guild or not self.bot.user:
+		content = message.content
+		if ("[[" not in content and "<@" not in content) or message.author.bot or not message.guild or not self.bot.user:
 			return
-		settings = types.SimpleNamespace(**self.bot.get_guild_settings(message.guild.id))		
+		with metrics.timer("listener", "on_message"):
+			await self.handle_message(message, content)
+
+	async def handle_message(self, message: discord.Message, content: str):
+		settings = await self.bot.settings.snapshot(message.guild.id, MessageSettings)
 
-		content = message.content
 		if content.strip() in (self.bot.user.mention, f"<@!{self.bot.user.id}>") and settings.help_on_mention:
 			try:
 				if self.owner is None:
@@ -43,40 +122,25 @@ class EventsCog(Cog):
 
 		elif settings.toggle_smart_referencing:
 			try:
-				queries = re.findall(r"\[\[(.+?)\]\]", content)
+				queries = reference_pattern.findall(content)
 				if not queries:
 					return
 
-				prefix = settings.link_prefix_message if settings.link_prefix_message and settings.link_prefix_message != "None" else ""
+				prefix = settings.prefix
 				plenary = await message.reply(f"{prefix} Loading...".strip())
 
 				finds = {}
-				url_format = "<%s>" if settings.silence_link_embeds else "%s"
-				loop = asyncio.get_event_loop()
-				props = {
-					"generator": "search",
-					"gsrwhat": "title",
-					"gsrlimit": 25,
-					"prop": "info",
-					"inprop": "url",
-				}
-
-				for query in queries:
-					props["gsrsearch"] = query
-					try:
-						wiki_task = loop.run_in_executor(None, lambda: self.bot.sites.wiki.get("query", **props))
-						archives_task = loop.run_in_executor(None, lambda: self.bot.sites.archives.get("query", **props))
-						
-						wiki_results, archives_results = await asyncio.gather(wiki_task, archives_task)
-
-						results = []
-						for result_group in (wiki_results, archives_results):
-							pages = result_group.get("query", {}).get("pages", {})
-							results.extend(pages.values())
+				url_format = settings.url_format
+				unique_queries = list(dict.fromkeys(queries))
+				resolved = await asyncio.gather(
+					*(self.resolve(message.guild.id, query) for query in unique_queries),
+					return_exceptions=True
+				)
 
-						titles_map = defaultdict(list)
-						for result in results:
-							titles_map[result["title"]].append(result)
+				for query, titles_map in zip(unique_queries, resolved):
+					try:
+						if isinstance(titles_map, BaseException):
+							raise titles_map
 
 						closest_titles = get_close_matches(query, titles_map.keys(), n=7, cutoff=0.5)
 						formatted_links = []
@@ -84,15 +148,13 @@ class EventsCog(Cog):
 						for title in closest_titles:
 							entries = titles_map[title]
 							if len(entries) == 1:
-								result = entries[0]
-								url = url_format % result["fullurl"]
+								_, url = entries[0]
+								url = url_format % url
 								formatted_links.append(f"[`{title}`]({url})")
 							else:
-								a, b = entries[:2]
-								url_a = url_format % a["fullurl"]
-								url_b = url_format % b["fullurl"]
-								site_a = "wiki" if "simdemocracy.miraheze.org" in url_a else "archives"
-								site_b = "wiki" if site_a == "archives" else "archives"
+								(site_a, url_a), (site_b, url_b) = entries[:2]
+								url_a = url_format % url_a
+								url_b = url_format % url_b
 								formatted_links.append(f"`{title} (`[`{site_a}`]({url_a})`, `[`{site_b}`]({url_b})`)`")
 
 						if formatted_links:
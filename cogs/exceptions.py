@@ -12,7 +12,10 @@ class ExceptionsCog(Cog):
 
 	@Cog.listener("on_app_command_error")
 	async def on_app_command_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
-		if isinstance(error, discord.app_commands.MissingPermissions):
+		if interaction.command is not None:
+			self.bot.metrics.command_errors[interaction.command.qualified_name] += 1;
+
+		if isinstance(error, discord.app_commands.CheckFailure):
 			embed = discord.Embed(
 				colour=discord.Colour.red(),
 				title=f":x: Unauthorized",
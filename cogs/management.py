@@ -1,4 +1,7 @@
 import discord
+import io
+import os
+import time
 import typing
 
 from discord.ext.commands import Cog
@@ -15,6 +18,9 @@ async def extension_autocomplete(interaction: discord.Interaction, current: str)
 
 	return options[:25]
 
+async def is_owner(interaction: discord.Interaction):
+	return await typing.cast(SDWikiBot, interaction.client).is_owner(interaction.user)
+
 class ManagementCog(Cog):
 	def __init__(self, bot: SDWikiBot):
 		self.bot = bot
@@ -50,5 +56,76 @@ class ManagementCog(Cog):
 
 			await interaction.followup.send(embed=embed)
 
+	diagnostics = discord.app_commands.Group(
+		name="diagnostics",
+		description="Profile the bot's memory and CPU usage (owner only)."
+	)
+
+	async def diagnostics_busy(self, interaction: discord.Interaction):
+		if not self.bot.diagnostics.busy:
+			return False
+
+		embed = discord.Embed(
+			title=":x: Diagnostics already running",
+			description="Wait for the current run to finish before starting another one.",
+			colour=discord.Colour.red()
+		)
+		await interaction.response.send_message(embed=embed, ephemeral=True)
+		return True
+
+	@diagnostics.command(description="Traces allocations for a while and shows where memory grew the most.")
+	@discord.app_commands.describe(
+		seconds="How long to trace allocations for.",
+		top="How many source lines to show.",
+		frames="How many stack frames to group allocations by."
+	)
+	@discord.app_commands.check(is_owner)
+	async def memory(self, interaction: discord.Interaction, seconds: discord.app_commands.Range[int, 1, 600] = 30, top: discord.app_commands.Range[int, 1, 25] = 10, frames: discord.app_commands.Range[int, 1, 10] = 1):
+		if await self.diagnostics_busy(interaction):
+			return
+		await interaction.response.defer(ephemeral=True, thinking=True)
+
+		stats, peak = await self.bot.diagnostics.trace_allocations(seconds, top, frames)
+		report = "\n\n".join(
+			f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+} blocks), {stat.size / 1024:.1f} KiB total\n" + "\n".join(stat.traceback.format())
+			for stat in stats
+		)
+
+		embed = discord.Embed(
+			title=":bar_chart: Allocation Diff",
+			description=f"Top `{len(stats)}` allocation sites over `{seconds}`s, `{peak / 1024:.1f}` KiB traced at peak.",
+			colour=discord.Colour.green()
+		)
+		await interaction.followup.send(
+			embed=embed,
+			file=discord.File(io.BytesIO((report or "No allocations grew.").encode()), filename=f"memory-{int(time.time())}.txt"),
+			ephemeral=True
+		)
+
+	@diagnostics.command(description="Samples every thread's stack for a while and returns a flame graph input file.")
+	@discord.app_commands.describe(seconds="How long to sample for.")
+	@discord.app_commands.check(is_owner)
+	async def profile(self, interaction: discord.Interaction, seconds: discord.app_commands.Range[int, 1, 300] = 10):
+		if await self.diagnostics_busy(interaction):
+			return
+		await interaction.response.defer(ephemeral=True, thinking=True)
+
+		stacks = await self.bot.diagnostics.profile(seconds)
+		samples = sum(int(line.rsplit(" ", 1)[1]) for line in stacks.splitlines())
+
+		embed = discord.Embed(
+			title=":fire: Profile",
+			description=(
+				f"Collected `{samples}` samples over `{seconds}`s in collapsed-stack format.\n"
+				"Open it in speedscope or render it with `flamegraph.pl`."
+			),
+			colour=discord.Colour.green()
+		)
+		await interaction.followup.send(
+			embed=embed,
+			file=discord.File(io.BytesIO(stacks.encode()), filename=f"profile-{os.getpid()}-{int(time.time())}.folded"),
+			ephemeral=True
+		)
+
 async def setup(bot: SDWikiBot):
 	await bot.add_cog(ManagementCog(bot))
\ No newline at end of file
@@ -1,13 +1,112 @@
-import discord, typing
+import discord, typing, asyncio, sqlite3, traceback
 from discord.ext.commands import Cog
 
 from bot import SDWikiBot
-from constants import EmbedPaginatorView, neutral_colour, wiki_colour, archives_colour
-from utils import chunk_list
+from constants import EmbedPaginatorView, PageSource, cache_duration, neutral_colour, wiki_colour, archives_colour, title_autocomplete
+from mediawiki import AsyncSite
+from mirror import SearchMirror
+from utils import ResultMerger, MergedResult
+
+class SearchPageSource(PageSource):
+	"""Renders search result pages on demand, fetching further results only when needed.
+
+	Sites the local mirror has finished loading are searched there; the others, or any
+	site the mirror fails on, go to the API and page through ``gsroffset``.
+	"""
+	per_page = 10
+
+	def __init__(self, sites: typing.List[typing.Tuple[str, AsyncSite]], query: str, where: str, template: discord.Embed, author: str, cache_duration: float, mirror: typing.Optional[SearchMirror] = None):
+		self.sites = sites
+		self.query = query
+		self.where = where
+		self.template = template
+		self.author = author
+		self.cache_duration = cache_duration
+		self.batch_size = 50 // len(sites)
+		self.offsets: typing.Dict[str, typing.Optional[int]] = {name: 0 for name, _ in sites} # None once a site is exhausted
+		self.results = ResultMerger(name for name, _ in sites)
+		self.mirror = mirror
+		self.snippets: typing.Dict[str, str] = {} # normalized title -> highlighted text, for local text searches
+
+	@property
+	def exhausted(self):
+		return all(offset is None for offset in self.offsets.values())
+
+	async def fetch_local(self, name: str, site: AsyncSite):
+		offset = self.offsets[name] or 0
+		rows = await self.mirror.search(name, self.query, self.where, limit=self.batch_size, offset=offset)
+		self.offsets[name] = offset + len(rows) if len(rows) == self.batch_size else None
+
+		if self.where == "text":
+			for title, snippet in rows:
+				self.snippets.setdefault(ResultMerger.normalize(title), snippet)
+		return [(name, offset + rank, title, site.page_url(title)) for rank, (title, _) in enumerate(rows)]
+
+	async def fetch_site(self, name: str, site: AsyncSite):
+		if self.mirror is not None and self.mirror.ready.get(name):
+			try:
+				return await self.fetch_local(name, site)
+			except sqlite3.Error as e:
+				traceback.print_exception(type(e), e, e.__traceback__)
+
+		resp = await site.get(
+			"query",
+			ttl=self.cache_duration,
+			generator="search",
+			gsrsearch=self.query,
+			gsrwhat=self.where,
+			gsrlimit=self.batch_size,
+			gsroffset=self.offsets[name] or None,
+			prop="info",
+			inprop="url"
+		)
+		offset = self.offsets[name] or 0
+		self.offsets[name] = resp.get("continue", {}).get("gsroffset")
+
+		pages = list(resp.get("query", {}).get("pages", {}).values())
+		pages.sort(key=lambda page: page.get("index", 0))
+		return [(name, offset + rank, page["title"], page["fullurl"]) for rank, page in enumerate(pages)]
+
+	async def fetch(self):
+		batches = await asyncio.gather(*(
+			self.fetch_site(name, site) for name, site in self.sites if self.offsets[name] is not None
+		))
+
+		self.results.add(result for batch in batches for result in batch)
+
+	def has_page(self, index: int) -> bool:
+		return index >= 0 and (len(self.results) > index * self.per_page or not self.exhausted)
+
+	async def get_page(self, index: int) -> typing.Optional[discord.Embed]:
+		if index < 0:
+			return None
+
+		while len(self.results) < (index + 1) * self.per_page and not self.exhausted:
+			await self.fetch()
+
+		chunk = self.results.entries[index * self.per_page:(index + 1) * self.per_page]
+		if not chunk:
+			return None
+
+		pages = -(-len(self.results) // self.per_page)
+		embed = self.template.copy().set_author(name=self.author).set_footer(text=f"Page ({index + 1}/{pages}{'' if self.exhausted else '+'})")
+		embed.description = "\n".join(f"- {self.format(entry)}" for entry in chunk)
+		return embed
+
+	def format(self, entry: MergedResult):
+		if len(entry.links) == 1:
+			line = f"[{entry.title}]({entry.links[0][1]})"
+		else:
+			line = f"{entry.title} (" + ", ".join(f"[{site_name}]({url})" for site_name, url in entry.links) + ")"
+
+		if (snippet := self.snippets.get(ResultMerger.normalize(entry.title))):
+			line += "\n  " + discord.utils.escape_markdown(snippet).replace("\x02", "**").replace("\x03", "**")
+		return line
 
 class SearchCog(Cog):
 	def __init__(self, bot: SDWikiBot):
 		self.bot = bot
+		self.cache_duration = cache_duration
 
 	@discord.app_commands.describe(
 		query="What you are searching for.",
@@ -24,6 +123,7 @@ class SearchCog(Cog):
 			discord.app_commands.Choice(name="In text", value="text")
 		]
 	)
+	@discord.app_commands.autocomplete(query=title_autocomplete)
 	@discord.app_commands.command(description="Search for a page.")
 	async def search(self, interaction: discord.Interaction, query: str, site: typing.Optional[str] = "both", where: typing.Optional[str] = "title"):
 		await interaction.response.defer(thinking=True)
@@ -36,68 +136,27 @@ class SearchCog(Cog):
 		).set_author(name="Loading")
 		lmsg = await interaction.followup.send(embed=lscreen, wait=True)
 
-		props = {
-			"generator": "search",
-			"gsrsearch": query,
-			"gsrwhat": where,
-			"prop": "info",
-			"inprop": "url",
-			"gsrlimit": 50
-		}
-
-		results = []
-		if site == "both":
-			props["gsrlimit"] = 25
-
-			results = []
-			wiki_results = self.bot.sites.wiki.get("query", **props)
-			archives_results = self.bot.sites.archives.get("query", **props)
-
-			if (wiki_pages := wiki_results["query"].get("pages")) is not None:
-				results += list(wiki_pages.values())
-
-			if (archives_pages := archives_results["query"].get("pages")) is not None:
-				results += list(archives_pages.values())
-			
-		else:
-			_site = self.bot.sites.wiki if site == "wiki" else self.bot.sites.archives
-			site_results = _site.get("query", **props)
-			if (site_pages := site_results["query"].get("pages")) is not None:
-				results = list(site_pages.values())
-
-		formatted = []
-		for result in results:
-			title = result["title"]
-			url = result["fullurl"]
-			hyperlink = f"[{title}]({url})"
-
-			dup_titles = [index for index, r in enumerate(results) if r["title"] == title]
-			if len(dup_titles) > 1:
-				other_res = results.pop(max(dup_titles))
-				other_url = other_res["fullurl"]
-				other_site_name = "wiki" if "simdemocracy.miraheze.org" in other_url else "archives"
-				site_name = "wiki" if "simdemocracy.miraheze.org" in url else "archives"
-				hyperlink = f"{title} ([{site_name}]({url}), [{other_site_name}]({other_url}))"
-
-			formatted.append(hyperlink)
-
-		if len(formatted) > 0:
-			chunks = chunk_list(formatted, 10)
-			embeds = []
-			for index, chunk in enumerate(chunks, start=1):
-				embed = lscreen.copy().set_author(name="" if site == "both" else (site or "").title()).set_footer(text=f"Page ({index}/{len(chunks)})")
-				embed.description = "\n".join(f"- {hyperlink}" for hyperlink in chunk)
-				embeds.append(embed)
-
-			if len(embeds) > 1:
-				paginator = EmbedPaginatorView(interaction.user)
-				paginator.items = embeds
-				await lmsg.edit(embed=embeds[0], view=paginator)
-			else:
-				await lmsg.edit(embed=embeds[0])
-		else:
+		sites = list(self.bot.sites) if site == "both" else [(site or "wiki", self.bot.sites.get(site or "wiki"))]
+		source = SearchPageSource(
+			sites,
+			query,
+			where or "title",
+			template=lscreen,
+			author="" if site == "both" else (site or "").title(),
+			cache_duration=self.cache_duration,
+			mirror=self.bot.mirror
+		)
+
+		first = await source.get_page(0)
+		if first is None:
 			lscreen.set_author(name="").description = "**`No results found.`**"
 			await lmsg.edit(embed=lscreen)
+		elif source.has_page(1):
+			paginator = EmbedPaginatorView(interaction.user, source=source)
+			paginator.curitem = first
+			await lmsg.edit(embed=first, view=paginator)
+		else:
+			await lmsg.edit(embed=first)
 
 async def setup(bot: SDWikiBot):
-	await bot.add_cog(SearchCog(bot));
\ No newline at end of file
+	await bot.add_cog(SearchCog(bot));
@@ -16,8 +16,7 @@ class SettingsCog(Cog):
 		self.group.add_command(self._set);
 
 	async def cog_load(self):
-		schema, _ = self.bot._return_settings();
-		for _, items in schema.items():
+		for _, items in self.bot.schema.items():
 			for item in items:
 				name = item["name"];
 
@@ -34,10 +33,8 @@ class SettingsCog(Cog):
 
 						assert interaction.guild;
 						guild_id = interaction.guild.id;
-						settings = self.bot.get_guild_settings(guild_id);
 						try:
-							settings[cmd_name] = value;
-							self.bot.sync_guild_settings(guild_id);
+							self.bot.set_guild_setting(guild_id, cmd_name, value);
 
 							embed = discord.Embed(
 								colour=discord.Colour.green(),
@@ -84,9 +81,7 @@ class SettingsCog(Cog):
 			await interaction.response.defer(thinking=True);
 		
 		assert(interaction.guild);
-		settings = self.bot.get_guild_settings(interaction.guild.id);
-		settings["toggle_smart_referencing"] = toggle;
-		self.bot.sync_guild_settings(interaction.guild.id);
+		self.bot.set_guild_setting(interaction.guild.id, "toggle_smart_referencing", toggle);
 		embed = discord.Embed(
 			colour=discord.Colour.green(),
 			title=f":white_check_mark: Success",
@@ -98,15 +93,14 @@ class SettingsCog(Cog):
 	async def _list(self, interaction: discord.Interaction):
 		await interaction.response.defer(thinking=True);
 		assert(interaction.guild);
-		settings = self.bot.get_guild_settings(interaction.guild.id);
+		settings = await self.bot.get_guild_settings(interaction.guild.id);
 		
 		embed = discord.Embed(
 			colour=neutral_colour,
 			title=f":gear: Settings{': **`' + interaction.guild.name + '`**' if interaction.guild else ''}".strip()
 		).set_thumbnail(url=interaction.guild.icon.url if interaction.guild.icon else None);
 
-		metadata = settings["metadata"];
-		for category, items in metadata.items():
+		for category, items in self.bot.schema.items():
 			description = "";
 			for item in items:
 				name = item["name"];
@@ -1,10 +1,13 @@
 import datetime
+import gc
+from collections import Counter
 import time
 import discord
 
 from discord.ext.commands import Cog
 from bot import SDWikiBot
 from constants import neutral_colour, archives_colour, wiki_colour
+from diagnostics import gc_collections, resident_memory
 
 class StatsCog(Cog):
 	def __init__(self, bot: SDWikiBot):
@@ -43,47 +46,32 @@ class StatsCog(Cog):
 		description="Gather info about various wiki stats."
 	)
 
-	@group.command(description="Displays statistics about the wiki.")
-	async def wiki(self, interaction: discord.Interaction):
+	async def send_site_statistics(self, interaction: discord.Interaction, site: str, colour: int, title: str):
 		await interaction.response.defer();
 
-		siteinfo = self.bot.sites.wiki.api(
-			"query", "GET", meta="siteinfo", siprop="statistics"
-		);
-		statistics = siteinfo["query"]["statistics"];
+		statistics, fetched = await self.bot.statistics.get(site);
 
 		embed = discord.Embed(
-			colour=wiki_colour,
-			title=":bar_chart: Wiki Statistics"
+			colour=colour,
+			title=title,
+			timestamp=datetime.datetime.fromtimestamp(fetched, tz=datetime.timezone.utc)
 		).add_field(name="Pages", value=str(statistics["articles"]), inline=False) \
 		 .add_field(name="Edits", value=str(statistics["edits"]), inline=False) \
 		 .add_field(name="Images", value=str(statistics["images"]), inline=False) \
 		 .add_field(name="Users", value=str(statistics["users"]), inline=False) \
 		 .add_field(name="Active Users", value=str(statistics["activeusers"]), inline=False) \
-		 .add_field(name="Admins", value=str(statistics["admins"]), inline=False);
+		 .add_field(name="Admins", value=str(statistics["admins"]), inline=False) \
+		 .set_footer(text="Last updated");
 
 		await interaction.followup.send(embed=embed);
 
+	@group.command(description="Displays statistics about the wiki.")
+	async def wiki(self, interaction: discord.Interaction):
+		await self.send_site_statistics(interaction, "wiki", wiki_colour, ":bar_chart: Wiki Statistics");
+
 	@group.command(description="Displays statistics about the archives.")
 	async def archives(self, interaction: discord.Interaction):
-		await interaction.response.defer();
-
-		siteinfo = self.bot.sites.archives.api(
-			"query", "GET", meta="siteinfo", siprop="statistics"
-		);
-		statistics = siteinfo["query"]["statistics"];
-
-		embed = discord.Embed(
-			colour=archives_colour,
-			title="\N{bar chart} Archives Statistics"
-		).add_field(name="Pages", value=str(statistics["articles"]), inline=False) \
-		 .add_field(name="Edits", value=str(statistics["edits"]), inline=False) \
-		 .add_field(name="Images", value=str(statistics["images"]), inline=False) \
-		 .add_field(name="Users", value=str(statistics["users"]), inline=False) \
-		 .add_field(name="Active Users", value=str(statistics["activeusers"]), inline=False) \
-		 .add_field(name="Admins", value=str(statistics["admins"]), inline=False);
-
-		await interaction.followup.send(embed=embed);
+		await self.send_site_statistics(interaction, "archives", archives_colour, "\N{bar chart} Archives Statistics");
 
 	@group.command(name="bot", description="Displays statistics about the bot.")
 	async def _bot(self, interaction: discord.Interaction):
@@ -92,7 +80,16 @@ class StatsCog(Cog):
 		uptime = datetime.timedelta(seconds=int(round(time.time() - self.bot.start_time)));
 		discordpy_version = discord.__version__;
 		commands = len(self.bot.tree.get_commands(type=discord.AppCommandType.chat_input));
-		current, heap = self.bot.tm.get_traced_memory();
+		collections = gc_collections();
+		pending = gc.get_count();
+		metrics = self.bot.metrics;
+		requests = Counter();
+		for (host, _), count in metrics.requests.items():
+			requests[host] += count;
+		slowest = sorted(
+			((name, histogram) for (kind, name), histogram in metrics.latencies.items() if kind == "command"),
+			key=lambda item: item[1].quantile(0.5), reverse=True
+		)[:5];
 
 		embed = discord.Embed(
 			colour=neutral_colour,
@@ -100,8 +97,19 @@ class StatsCog(Cog):
 		).add_field(name="Uptime", value=f"`{uptime}`", inline=False) \
 		 .add_field(name="Discord.py Version", value=f"`{discordpy_version}`", inline=False) \
 		 .add_field(name="Commands", value=str(commands)) \
-		 .add_field(name="Allocated Memory", value=self.format_bytes(current), inline=False) \
-		 .add_field(name="Memory Heap", value=self.format_bytes(heap));
+		 .add_field(name="Resident Memory", value=self.format_bytes(resident_memory()), inline=False) \
+		 .add_field(name="GC Collections", value=" / ".join(f"`{count}`" for count in collections)) \
+		 .add_field(name="GC Pending", value=" / ".join(f"`{count}`" for count in pending)) \
+		 .add_field(name="Result Cache", value=f"`{len(self.bot.results)}` entries, `{self.bot.results.hit_ratio:.0%}` hit rate", inline=False) \
+		 .add_field(name="Event Loop Lag", value=f"`{metrics.last_loop_lag * 1000:.1f}`ms now, `{metrics.loop_lag.quantile(0.99) * 1000:g}`ms p99") \
+		 .add_field(name="Executor Queue", value=f"`{self.bot.executor._work_queue.qsize()}` waiting") \
+		 .add_field(name="API Requests", value="\n".join(
+			f"`{host}`: `{count}`" for host, count in sorted(requests.items())
+		 ) or "`None`", inline=False) \
+		 .add_field(name="Slowest Commands (p50 / p99)", value="\n".join(
+			f"`/{name}`: `{histogram.quantile(0.5) * 1000:g}`ms / `{histogram.quantile(0.99) * 1000:g}`ms"
+			for name, histogram in slowest
+		 ) or "`None`", inline=False);
 
 		await interaction.followup.send(embed=embed);
 
@@ -1,16 +1,18 @@
-import discord, typing, time, asyncio;
+import discord, asyncio;
 from sentence_splitter import split_text_into_sentences;
 from discord.ext.commands import Cog;
 from datetime import datetime;
 from bot import SDWikiBot;
-from constants import neutral_colour, wiki_colour, archives_colour;
+from mediawiki import AsyncSite, APIError;
+from utils import parse_timestamp;
+from constants import cache_duration, neutral_colour, wiki_colour, archives_colour, title_autocomplete;
 
 class SelectionView(discord.ui.View):
-	event = asyncio.Event();
 	location: str = "";
 
 	def __init__(self):
 		super().__init__(timeout=None);
+		self.event = asyncio.Event();
 
 	@discord.ui.button(label="Wiki", style=discord.ButtonStyle.gray)
 	async def wiki(self, interaction: discord.Interaction, _):
@@ -31,8 +33,86 @@ class SelectionView(discord.ui.View):
 class WikiCog(Cog):
 	def __init__(self, bot: SDWikiBot):
 		self.bot = bot;
+		self.cache_duration = cache_duration;
+		self.summary_duration = 86400; # seconds, summaries are keyed by revision
+		self.summary_length = 500;
+		self.summary_prefix = 2000; # characters handed to the sentence splitter
+
+	async def get_page(self, site: AsyncSite, title: str) -> dict:
+		"""Fetches existence, the latest revision, the creation log entry and the intro extract in one query.
+
+		The extract is left out once a summary of the page has been cached.
+		"""
+		summarized = self.bot.summaries.get((site.api_url, title)) is not None;
+		try:
+			query = (await site.get(
+				"query",
+				ttl=self.cache_duration,
+				titles=title,
+				prop="info|revisions" if summarized else "info|revisions|extracts",
+				rvprop="ids|timestamp|user|comment",
+				**({} if summarized else {"exintro": True, "explaintext": True}), # unrecognized without extracts
+				list="logevents",
+				letype="create",
+				letitle=title,
+				lelimit=1, # newest first, the creation of the page now under this title if any
+				leprop="ids|user|timestamp"
+			)).get("query", {});
+		except APIError:
+			return {};
+
+		page = next(iter(query.get("pages", {}).values()), {});
+		if "pageid" not in page:
+			return page;
+
+		# a creation logged under this title may belong to a page since deleted or moved away
+		creation = next(iter(query.get("logevents", [])), None);
+		if creation is not None and creation.get("logpage") != page["pageid"]:
+			creation = None;
+		return {**page, "creation": creation};
+
+	def summarize(self, extract: str):
+		summary = "";
+		for sentence in split_text_into_sentences(extract[:self.summary_prefix], language="en"):
+			if len(summary) < self.summary_length:
+				summary += " " + sentence;
+			else:
+				break;
+		return summary;
+
+	async def get_summary(self, site: AsyncSite, page: dict, title: str):
+		key = (site.api_url, page["pageid"], page["lastrevid"]);
+		if (summary := self.bot.summaries.get(key)) is not None:
+			return summary;
+
+		if "extract" in page:
+			extract = page["extract"];
+		else:
+			extract = (await site.get("query", prop="extracts", exintro=True, explaintext=True, pageids=page["pageid"])) \
+						.get("query", {}) \
+						.get("pages", {}) \
+						.get(str(page["pageid"]), {}) \
+						.get("extract", None);
+
+		summary = self.summarize(extract) if extract else "";
+		self.bot.summaries.set(key, summary, self.summary_duration);
+		self.bot.summaries.set((site.api_url, title), page["lastrevid"], self.summary_duration);
+		return summary;
+
+	async def get_revisions(self, site: AsyncSite, pageid: int, newer: bool = False) -> list:
+		pages = (await site.get(
+			"query",
+			ttl=self.cache_duration,
+			prop="revisions",
+			pageids=pageid,
+			rvprop="ids|timestamp|user|comment",
+			rvlimit=1,
+			rvdir="newer" if newer else None
+		)).get("query", {}).get("pages", {});
+		return pages.get(str(pageid), {}).get("revisions", []);
 
 	@discord.app_commands.describe(page="The page you wish to view information for.")
+	@discord.app_commands.autocomplete(page=title_autocomplete)
 	@discord.app_commands.command(description="View information about a page.")
 	async def pageinfo(self, interaction: discord.Interaction, page: str):
 		await interaction.response.defer(thinking=True);
@@ -44,15 +124,17 @@ class WikiCog(Cog):
 		).set_author(name="Loading");
 		lmsg = await interaction.followup.send(embed=lscreen, wait=True);
 
-		wiki_page = self.bot.sites.wiki.pages.get(page);
-		archives_page = self.bot.sites.archives.pages.get(page);
+		wiki_page, archives_page = await asyncio.gather(
+			self.get_page(self.bot.sites.wiki, page),
+			self.get_page(self.bot.sites.archives, page)
+		);
 
-		if not wiki_page and not archives_page:
-			lscreen.set_author(name="").description = "**`No results found.`**";
+		if "pageid" not in wiki_page and "pageid" not in archives_page:
+			lscreen.set_author(name="").description = "**`This page does not exist.`**";
 			await lmsg.edit(embed=lscreen);
 			return;
 
-		if all(getattr(page, "pageid") is not None for page in [wiki_page, archives_page]):
+		if all("pageid" in page for page in [wiki_page, archives_page]):
 			lscreen.set_author(name="").description = "This page exists in both the wiki and archives. For which page do you want to view information?";
 			selection_view = SelectionView();
 			await lmsg.edit(embed=lscreen, view=selection_view);
@@ -65,53 +147,36 @@ class WikiCog(Cog):
 				site = self.bot.sites.archives;
 				_page = archives_page;
 		else:
-			_page = wiki_page if wiki_page.pageid not in ["", None] else archives_page;
-			if _page.pageid in ["", None]:
-				lscreen.set_author(name="").description = "**`This page does not exist.`**";
-				await lmsg.edit(embed=lscreen);
-				return;
-
-			site = self.bot.sites.wiki if _page == wiki_page else self.bot.sites.archives;
+			_page = wiki_page if "pageid" in wiki_page else archives_page;
+			site = self.bot.sites.wiki if _page is wiki_page else self.bot.sites.archives;
 
-		latest_revisions: typing.Any = list(_page.revisions(max_items=1));
-		oldest_revisions: typing.Any = list(_page.revisions(max_items=1, dir="newer"));
+		latest_revisions = _page.get("revisions", []);
+		# pages imported, recreated or moved here without their own creation entry need one extra request
+		oldest_revisions = [_page["creation"]] if _page["creation"] else await self.get_revisions(site, _page["pageid"], newer=True);
 
 		if len(latest_revisions) > 0:
 			latest_revision = latest_revisions[0];
 
 			_id = latest_revision["revid"];
-			user = latest_revision["user"];
-			comment = latest_revision["comment"] or "**`No comment.`**";
-			timestamp = int(time.mktime(latest_revision["timestamp"]));
-			url = f"https://{site.host}{site.path}index.php?diff={_id}";
+			user = latest_revision.get("user", "");
+			comment = latest_revision.get("comment") or "**`No comment.`**";
+			timestamp = int(parse_timestamp(latest_revision["timestamp"]).timestamp());
+			url = f"{site.index_url}?diff={_id}";
 			
 			lscreen.add_field(name="Latest edit", value=f"[`{_id}` - _{comment[:200] + '...' if len(comment) > 200 else comment}_ by **{user}**]({url})\n<t:{timestamp}:R>", inline=False); 
 
 		if len(oldest_revisions) > 0:
 			oldest_revision = oldest_revisions[0];
 
-			creation_timestamp = time.mktime(oldest_revision["timestamp"]);
+			creation_timestamp = parse_timestamp(oldest_revision["timestamp"]).timestamp();
 			creation_readable = datetime.fromtimestamp(creation_timestamp).strftime("%B %d, %Y at %I:%M %p");
-			created_by = oldest_revision["user"];
+			created_by = oldest_revision.get("user", "");
 			
 			lscreen \
 				.add_field(name="Creation date", value=f"{creation_readable}\n<t:{int(creation_timestamp)}:R>", inline=False) \
 				.add_field(name="Created by", value=created_by);
 
-		extract = site.get("query", prop="extracts", exintro="", explaintext="", titles=_page.name) \
-					.get("query", {}) \
-					.get("pages", {}) \
-					.get(str(_page.pageid), {}) \
-					.get("extract", None);
-
-		lscreen.description = "";
-		if extract:
-			sentences = split_text_into_sentences(extract, language="en");
-			for sentence in sentences:
-				if len(lscreen.description) < 500:
-					lscreen.description += " " + sentence;
-				else:
-					break;
+		lscreen.description = await self.get_summary(site, _page, page);
 
 		lscreen.set_author(name=("wiki" if site == self.bot.sites.wiki else "archives").title());
 		lscreen.colour = wiki_colour if site == self.bot.sites.wiki else archives_colour;
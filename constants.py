@@ -1,23 +1,50 @@
 wiki_colour = 0x061442
 archives_colour = 0x6e4e36
 neutral_colour = 0x0B1215
-import discord, typing;
+
+# How long, in seconds, cogs cache MediaWiki API results. SDWikiBot.invalidate_results drops
+# the entries a recent change affects, so this only bounds staleness the poller cannot see.
+cache_duration = 3600
+import abc, discord, typing;
+from titleindex import complete;
+
+class PageSource(abc.ABC):
+    """Supplies the pages of an EmbedPaginatorView on demand."""
+
+    @abc.abstractmethod
+    async def get_page(self, index: int) -> typing.Optional[discord.Embed]:
+        ...
+
+    @abc.abstractmethod
+    def has_page(self, index: int) -> bool:
+        ...
 
 class EmbedPaginatorView(discord.ui.View):
     curitem: discord.Embed
     message: typing.Optional[discord.InteractionMessage]
 
-    def __init__(self, user: typing.Union[discord.User, discord.Member]):
+    def __init__(self, user: typing.Union[discord.User, discord.Member], source: typing.Optional[PageSource] = None):
         super().__init__(timeout=180)
         self.user = user
         self.curindex = 0
         self.items = []
+        self.source = source
         self.message = None
 
     def add_embed(self, embed: discord.Embed):
         self.items.append(embed)
         return self
 
+    async def get_page(self, index: int) -> typing.Optional[discord.Embed]:
+        if self.source is not None:
+            return await self.source.get_page(index)
+        return self.items[index] if 0 <= index < len(self.items) else None
+
+    def has_page(self, index: int) -> bool:
+        if self.source is not None:
+            return self.source.has_page(index)
+        return 0 <= index < len(self.items)
+
     @discord.ui.button(label="Next Page", custom_id="next", style=discord.ButtonStyle.green)
     async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not interaction.user == self.user:
@@ -26,11 +53,11 @@ class EmbedPaginatorView(discord.ui.View):
 
         await interaction.response.defer()
 
-        if 0 <= (newindex := self.curindex + 1) < len(self.items):
+        if (page := await self.get_page(newindex := self.curindex + 1)) is not None:
             self.curindex = newindex
-            self.curitem = self.items[newindex]
+            self.curitem = page
 
-        if self.curindex == len(self.items) - 1:
+        if not self.has_page(self.curindex + 1):
             button.disabled = True
 
         prev_btn = next((c for c in self.children if isinstance(c, discord.ui.Button) and c.custom_id == "previous"), None)
@@ -47,15 +74,15 @@ class EmbedPaginatorView(discord.ui.View):
 
         await interaction.response.defer()
 
-        if 0 <= (newindex := self.curindex - 1) < len(self.items):
+        if (page := await self.get_page(newindex := self.curindex - 1)) is not None:
             self.curindex = newindex
-            self.curitem = self.items[newindex]
+            self.curitem = page
 
         if self.curindex == 0:
             button.disabled = True
 
         next_btn = next((c for c in self.children if isinstance(c, discord.ui.Button) and c.custom_id == "next"), None)
-        if next_btn and self.curindex < len(self.items) - 1:
+        if next_btn and self.has_page(self.curindex + 1):
             next_btn.disabled = False
 
         self.message = await interaction.edit_original_response(embed=self.curitem, view=self)
@@ -67,3 +94,11 @@ class EmbedPaginatorView(discord.ui.View):
                     child.disabled = True
             self.curitem.set_footer(text=(self.curitem.footer.text or "") + " | Embed timed out")
             await self.message.edit(embed=self.curitem, view=self)
+
+async def title_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggests titles from both sites' title indexes; no API requests are made."""
+    indexes = getattr(interaction.client, "title_indexes", {}).values()
+    return [
+        discord.app_commands.Choice(name=title, value=title)
+        for title in complete(indexes, current, limit=25, max_length=100) # the longest a choice may be
+    ]
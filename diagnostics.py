@@ -0,0 +1,93 @@
+import asyncio, gc, os, sys, threading, tracemalloc, typing;
+from collections import Counter;
+
+def resident_memory() -> int:
+	"""The process' resident set size in bytes, falling back to its peak where ``/proc`` is unavailable, or 0 on Windows."""
+	try:
+		with open("/proc/self/statm", "rb") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE");
+	except (OSError, ValueError, IndexError):
+		try:
+			import resource; # Unix only
+		except ImportError:
+			return 0;
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss;
+		return peak if sys.platform == "darwin" else peak * 1024;
+
+def gc_collections() -> typing.List[int]:
+	return [generation["collections"] for generation in gc.get_stats()];
+
+class Diagnostics:
+	"""Opt-in memory tracing and stack sampling, one run at a time.
+
+	Neither runs unless asked for: tracemalloc is only started for the requested window
+	and stopped again afterwards, and the sampler is a daemon thread that lives for the
+	duration of a single profile.
+	"""
+
+	ignored = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>");
+
+	def __init__(self):
+		self.lock = asyncio.Lock();
+
+	@property
+	def busy(self):
+		return self.lock.locked();
+
+	async def trace_allocations(self, seconds: float, limit: int = 10, frames: int = 1):
+		"""Traces allocations for ``seconds`` and returns the ``limit`` lines whose allocations grew the most."""
+		async with self.lock:
+			if tracemalloc.is_tracing():
+				raise RuntimeError("tracemalloc is already running");
+
+			filters = [tracemalloc.Filter(False, filename) for filename in self.ignored];
+			tracemalloc.start(frames);
+			try:
+				before = tracemalloc.take_snapshot().filter_traces(filters);
+				await asyncio.sleep(seconds);
+				after = tracemalloc.take_snapshot().filter_traces(filters);
+				_, peak = tracemalloc.get_traced_memory();
+			finally:
+				tracemalloc.stop();
+
+			stats = after.compare_to(before, "traceback" if frames > 1 else "lineno");
+			return stats[:limit], peak;
+
+	async def profile(self, seconds: float, interval: float = 0.005):
+		"""Samples every thread's stack for ``seconds`` and returns them in collapsed-stack format.
+
+		Each line is ``frame;frame;...;frame count``, outermost frame first, which
+		``flamegraph.pl``, speedscope and most other flame graph tools read directly.
+		"""
+		async with self.lock:
+			stacks: typing.Counter[str] = Counter();
+			done = threading.Event();
+			sampler = threading.Thread(target=self._sample, args=(stacks, done, interval), name="sdwikibot-sampler", daemon=True);
+			sampler.start();
+			try:
+				await asyncio.sleep(seconds);
+			finally:
+				done.set();
+				await asyncio.get_running_loop().run_in_executor(None, sampler.join);
+
+			return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common());
+
+	@staticmethod
+	def _sample(stacks: typing.Counter[str], done: threading.Event, interval: float):
+		names = {};
+		own = threading.get_ident();
+		while not done.wait(interval):
+			for thread in threading.enumerate():
+				names[thread.ident] = thread.name;
+
+			for ident, frame in sys._current_frames().items():
+				if ident == own:
+					continue;
+
+				calls = [];
+				while frame is not None:
+					code = frame.f_code;
+					calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})");
+					frame = frame.f_back;
+				calls.append(names.get(ident, str(ident)));
+				stacks[";".join(reversed(calls))] += 1;
@@ -1,6 +1,7 @@
-import discord, asyncio, os, mwclient, tracemalloc;
+import discord, asyncio, os;
 from dotenv import load_dotenv;
 from bot import SDWikiBot, Sites;
+from mediawiki import AsyncSite;
 
 load_dotenv();
 token = os.getenv("TOKEN");
@@ -10,14 +11,12 @@ if not token:
 	raise EnvironmentError("Bot token not supplied");
 
 async def main():
-	tracemalloc.start();
 	async with SDWikiBot(
 		"sdwikibot!",
 		sites=Sites(
-			wiki=mwclient.Site("simdemocracy.miraheze.org", clients_useragent=user_agent),
-			archives=mwclient.Site("qwrky.dev", path="/mediawiki/", clients_useragent=user_agent)
+			wiki=AsyncSite("simdemocracy.miraheze.org", user_agent=user_agent),
+			archives=AsyncSite("qwrky.dev", path="/mediawiki/", user_agent=user_agent)
 		),
-		tm=tracemalloc,
 		intents=discord.Intents.all(),
 		activity=discord.Activity(type=discord.ActivityType.watching, name="documents"),
 		status=discord.Status.idle
@@ -0,0 +1,174 @@
+import aiohttp, asyncio, json, time, typing;
+from urllib.parse import quote, urlencode;
+from cache import HTTPCache, ResultCache, SingleFlight;
+from metrics import metrics;
+
+class APIError(Exception):
+	def __init__(self, code: str, info: str):
+		super().__init__(f"{code}: {info}");
+		self.code = code;
+		self.info = info;
+
+class AsyncSite:
+	"""An asyncio MediaWiki API client backed by a pooled keep-alive session."""
+
+	def __init__(self, host: str, path: str = "/w/", scheme: str = "https", user_agent: typing.Optional[str] = None, timeout: float = 30, connections: int = 8):
+		self.host = host;
+		self.path = path;
+		self.scheme = scheme;
+		self.user_agent = user_agent;
+		self.timeout = aiohttp.ClientTimeout(total=timeout);
+		self.connections = connections;
+		self.cache: typing.Optional[ResultCache] = None;
+		self.http_cache: typing.Optional[HTTPCache] = None;
+		self.flights = SingleFlight();
+		self._session: typing.Optional[aiohttp.ClientSession] = None;
+
+	@property
+	def api_url(self):
+		return f"{self.scheme}://{self.host}{self.path}api.php";
+
+	@property
+	def index_url(self):
+		return f"{self.scheme}://{self.host}{self.path}index.php";
+
+	def page_url(self, title: str):
+		return f"{self.index_url}?title={quote(title.replace(' ', '_'), safe='/:')}";
+
+	@property
+	def session(self):
+		if self._session is None or self._session.closed:
+			self._session = aiohttp.ClientSession(
+				connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+				headers={"User-Agent": self.user_agent} if self.user_agent else None,
+				timeout=self.timeout
+			);
+		return self._session;
+
+	async def close(self):
+		if self._session is not None and not self._session.closed:
+			await self._session.close();
+		self._session = None;
+
+	@staticmethod
+	def _encode(params: dict):
+		encoded = {};
+		for key, value in params.items():
+			if value is None or value is False:
+				continue;
+			elif value is True:
+				encoded[key] = "";
+			elif isinstance(value, (list, tuple, set)):
+				encoded[key] = "|".join(map(str, value));
+			else:
+				encoded[key] = str(value);
+		return encoded;
+
+	@staticmethod
+	def module(params: dict):
+		"""Names the API module a request is for, e.g. ``query:search`` or ``query:siteinfo``."""
+		for key in ("generator", "list", "meta", "prop"):
+			if key in params:
+				return f"{params['action']}:{params[key]}";
+		return params["action"];
+
+	@staticmethod
+	def is_empty(data: dict):
+		query = data.get("query");
+		if not query:
+			return True;
+		pages = query.get("pages");
+		return pages is not None and all("missing" in page or "invalid" in page for page in pages.values());
+
+	def tags(self, params: dict, data: dict):
+		"""Tags a cached response with the titles it describes, or with the kind of search that produced it."""
+		if params.get("generator") == "search" or params.get("list") == "search":
+			what = params.get("gsrwhat", params.get("srwhat", "text"));
+			return [(self.api_url, "search", what)];
+
+		tags = [(self.api_url, "title", title) for title in str(params.get("titles", "")).split("|") if title];
+		for page in data.get("query", {}).get("pages", {}).values():
+			if "title" in page:
+				tags.append((self.api_url, "title", page["title"]));
+		return tags;
+
+	async def get(self, action: str, timeout: typing.Optional[float] = None, ttl: typing.Optional[float] = None, **params) -> dict:
+		if ttl is not None:
+			# without these the API answers with a private, zero-lifetime Cache-Control the HTTP cache cannot keep
+			params.setdefault("maxage", int(ttl));
+			params.setdefault("smaxage", int(ttl));
+
+		if ttl is not None and self.cache is not None:
+			key = ResultCache.make_key(self.api_url, action, params);
+			if (data := self.cache.get(key)) is not None:
+				return data;
+
+			# identical requests made while this one is in flight wait for its answer
+			return await self.flights.do(key, lambda: self._get_and_cache(key, action, timeout, ttl, params));
+
+		data = await self._fetch(self._encode({"action": action, "format": "json", **params}), timeout);
+		if "error" in data:
+			raise APIError(data["error"].get("code", "unknown"), data["error"].get("info", ""));
+		return data;
+
+	async def _fetch(self, params: dict, timeout: typing.Optional[float] = None) -> dict:
+		"""Returns a decoded response, from the HTTP cache while it is fresh and revalidating it once it is not."""
+		loop = asyncio.get_running_loop();
+		key = f"{self.api_url}?{urlencode(sorted(params.items()))}";
+		entry = self.http_cache.lookup(key) if self.http_cache is not None else None;
+		if entry is not None and entry.expires > time.time():
+			if (body := await loop.run_in_executor(None, self.http_cache.body, key)) is not None:
+				self.http_cache.hits += 1;
+				return json.loads(body);
+			entry = None;
+
+		module = self.module(params);
+		try:
+			async with self.session.get(
+				self.api_url,
+				params=params,
+				headers=self.http_cache.conditional_headers(entry) if entry is not None else None,
+				timeout=aiohttp.ClientTimeout(total=timeout) if timeout else self.timeout # None would disable the session's timeout
+			) as resp:
+				if resp.status == 304 and entry is not None:
+					body = await loop.run_in_executor(None, self.http_cache.revalidate, key, resp.headers);
+					stored = body is not None;
+				else:
+					resp.raise_for_status();
+					body, stored = await resp.read(), False;
+				headers = resp.headers;
+		except Exception:
+			metrics.count_request(self.host, module, failed=True);
+			raise;
+
+		if body is None: # evicted between the conditional request and its answer
+			metrics.count_request(self.host, module);
+			return await self._fetch(params, timeout);
+
+		data = json.loads(body);
+		metrics.count_request(self.host, module, failed="error" in data);
+		if self.http_cache is not None:
+			if stored:
+				self.http_cache.revalidated += 1;
+			else:
+				self.http_cache.misses += 1;
+				if "error" not in data:
+					await loop.run_in_executor(None, self.http_cache.store, key, body, headers);
+		return data;
+
+	async def _get_and_cache(self, key, action: str, timeout: typing.Optional[float], ttl: float, params: dict):
+		data = await self.get(action, timeout=timeout, **params);
+		self.cache.set(key, data, ttl, negative=self.is_empty(data), tags=self.tags(params, data));
+		return data;
+
+	async def query(self, **params) -> typing.AsyncIterator[dict]:
+		"""Yields the ``query`` block of every response, following ``continue`` until exhausted."""
+		params = dict(params);
+		while True:
+			resp = await self.get("query", **params);
+			yield resp.get("query", {});
+
+			if (cont := resp.get("continue")) is not None:
+				params.update(cont);
+			else:
+				break;
@@ -0,0 +1,145 @@
+import asyncio, bisect, contextlib, time, typing;
+from collections import Counter;
+from aiohttp import web;
+
+class Histogram:
+	"""A cumulative-bucket latency histogram, in seconds."""
+	buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0);
+
+	def __init__(self):
+		self.counts = [0] * (len(self.buckets) + 1);
+		self.sum = 0.0;
+		self.count = 0;
+
+	def observe(self, value: float):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1;
+		self.sum += value;
+		self.count += 1;
+
+	def quantile(self, q: float):
+		"""Returns the upper bound of the bucket holding the ``q`` quantile."""
+		if not self.count:
+			return 0.0;
+		rank, seen = q * self.count, 0;
+		for bound, count in zip(self.buckets, self.counts):
+			seen += count;
+			if seen >= rank:
+				return bound;
+		return float("inf");
+
+	def render(self, name: str, labels: str):
+		lines, cumulative = [], 0;
+		prefix, suffix = f"{labels}," if labels else "", f"{{{labels}}}" if labels else "";
+		for bound, count in zip(self.buckets, self.counts):
+			cumulative += count;
+			lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}');
+		lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}');
+		lines.append(f"{name}_sum{suffix} {self.sum}");
+		lines.append(f"{name}_count{suffix} {self.count}");
+		return lines;
+
+def _escape(value) -> str:
+	return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n");
+
+class Metrics:
+	"""The bot's runtime metrics, rendered in the Prometheus text format.
+
+	Latencies are kept per app command and per listener, MediaWiki requests are counted
+	per site and module, and everything owned elsewhere (cache counters, executor queue
+	depth) is read through registered callbacks at render time.
+	"""
+
+	def __init__(self):
+		self.latencies: typing.Dict[typing.Tuple[str, str], Histogram] = {};
+		self.requests: typing.Counter[typing.Tuple[str, str]] = Counter();
+		self.request_errors: typing.Counter[typing.Tuple[str, str]] = Counter();
+		self.command_errors: typing.Counter[str] = Counter();
+		self.loop_lag = Histogram();
+		self.last_loop_lag = 0.0;
+		self.collectors: typing.Dict[str, typing.Tuple[str, str, typing.Callable[[], typing.Iterable[typing.Tuple[dict, float]]]]] = {};
+
+	def observe(self, kind: str, name: str, seconds: float):
+		if (histogram := self.latencies.get((kind, name))) is None:
+			histogram = self.latencies[(kind, name)] = Histogram();
+		histogram.observe(seconds);
+
+	@contextlib.contextmanager
+	def timer(self, kind: str, name: str):
+		start = time.perf_counter();
+		try:
+			yield;
+		finally:
+			self.observe(kind, name, time.perf_counter() - start);
+
+	def count_request(self, site: str, module: str, failed: bool = False):
+		self.requests[(site, module)] += 1;
+		if failed:
+			self.request_errors[(site, module)] += 1;
+
+	def register(self, name: str, description: str, callback: typing.Callable[[], typing.Iterable[typing.Tuple[dict, float]]], kind: str = "gauge"):
+		"""Adds a metric whose ``(labels, value)`` samples are read from ``callback`` at render time."""
+		self.collectors[name] = (kind, description, callback);
+
+	async def monitor_loop(self, interval: float = 0.5):
+		while True:
+			start = time.monotonic();
+			await asyncio.sleep(interval);
+			self.last_loop_lag = max(0.0, time.monotonic() - start - interval);
+			self.loop_lag.observe(self.last_loop_lag);
+
+	def render(self):
+		lines = [
+			"# HELP sdwikibot_latency_seconds Time taken by app commands and listeners.",
+			"# TYPE sdwikibot_latency_seconds histogram"
+		];
+		for (kind, name), histogram in sorted(self.latencies.items()):
+			lines += histogram.render("sdwikibot_latency_seconds", f'kind="{_escape(kind)}",name="{_escape(name)}"');
+
+		lines += [
+			"# HELP sdwikibot_mediawiki_requests_total MediaWiki API requests sent, by site and module.",
+			"# TYPE sdwikibot_mediawiki_requests_total counter"
+		];
+		lines += [f'sdwikibot_mediawiki_requests_total{{site="{_escape(site)}",module="{_escape(module)}"}} {count}' for (site, module), count in sorted(self.requests.items())];
+
+		lines += [
+			"# HELP sdwikibot_mediawiki_request_errors_total MediaWiki API requests that failed, by site and module.",
+			"# TYPE sdwikibot_mediawiki_request_errors_total counter"
+		];
+		lines += [f'sdwikibot_mediawiki_request_errors_total{{site="{_escape(site)}",module="{_escape(module)}"}} {count}' for (site, module), count in sorted(self.request_errors.items())];
+
+		lines += [
+			"# HELP sdwikibot_command_errors_total App commands that raised, by command.",
+			"# TYPE sdwikibot_command_errors_total counter"
+		];
+		lines += [f'sdwikibot_command_errors_total{{name="{_escape(name)}"}} {count}' for name, count in sorted(self.command_errors.items())];
+
+		lines += [
+			"# HELP sdwikibot_event_loop_lag_seconds How late the event loop woke up from a scheduled sleep.",
+			"# TYPE sdwikibot_event_loop_lag_seconds histogram"
+		];
+		lines += self.loop_lag.render("sdwikibot_event_loop_lag_seconds", "");
+
+		for name, (kind, description, callback) in sorted(self.collectors.items()):
+			lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"];
+			for labels, value in callback():
+				rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items());
+				lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}");
+
+		return "\n".join(lines) + "\n";
+
+	async def serve(self, host: str = "127.0.0.1", port: int = 9108):
+		async def handle(_: web.Request):
+			return web.Response(text=self.render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"});
+
+		app = web.Application();
+		app.router.add_get("/metrics", handle);
+		runner = web.AppRunner(app, access_log=None);
+		await runner.setup();
+		await web.TCPSite(runner, host, port).start();
+		print(f"[METRICS] Serving metrics on http://{host}:{port}/metrics");
+		try:
+			await asyncio.Event().wait();
+		finally:
+			await runner.cleanup();
+
+metrics = Metrics();
@@ -0,0 +1,190 @@
+import asyncio, json, os, re, sqlite3, threading, traceback, typing;
+from mediawiki import AsyncSite;
+
+def plaintext(wikitext: str) -> str:
+	"""Strips the markup that matters for searching from wikitext; not a renderer."""
+	text = re.sub(r"<!--.*?-->|<ref[^>/]*/>|<ref[^>]*>.*?</ref>", " ", wikitext, flags=re.S);
+	while (stripped := re.sub(r"\{\{[^{}]*\}\}", " ", text)) != text: # innermost templates first
+		text = stripped;
+	text = re.sub(r"\{\|.*?\|\}", lambda table: re.sub(r"^\s*(\{\||\|\}|\|-|!|\|)", " ", table.group(0), flags=re.M), text, flags=re.S);
+	text = re.sub(r"\[\[(?:File|Image|Category):[^\]]*\]\]", " ", text, flags=re.I);
+	text = re.sub(r"\[\[(?:[^\]|]*\|)?([^\]]*)\]\]", r"\1", text);
+	text = re.sub(r"\[https?://\S+\s*([^\]]*)\]", r"\1", text);
+	text = re.sub(r"<[^>]+>|'{2,}|^=+|=+$|^[*#:;]+", "", text, flags=re.M);
+	return " ".join(text.split());
+
+class SearchMirror:
+	"""A local SQLite FTS5 copy of every site's main-namespace titles and text.
+
+	Each site is loaded once by a bulk crawl over ``generator=allpages`` with the latest
+	revision's content. The crawl's continuation is committed with every batch, so it
+	resumes where it stopped after a restart. Afterwards, pages named by recent changes
+	are queued and refetched in batches. Searches rank with bm25, weighting titles over
+	text, and return highlighted snippets. A site only answers locally once its crawl has
+	finished; callers fall back to the API until then.
+	"""
+
+	batch_size = 50 # the most pages the API returns content for in one request
+
+	def __init__(self, sites: typing.Iterable[typing.Tuple[str, AsyncSite]], filename: str = "cache/mirror.db", namespace: int = 0, sync_interval: float = 10):
+		self.sites = dict(sites);
+		self.namespace = namespace;
+		self.sync_interval = sync_interval;
+		self.pending: typing.Dict[str, typing.Set[str]] = {name: set() for name in self.sites};
+		self._lock = threading.Lock();
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self._conn = sqlite3.connect(filename, check_same_thread=False);
+		self._conn.execute("PRAGMA journal_mode=WAL");
+		self._conn.execute("PRAGMA synchronous=NORMAL");
+		self._conn.executescript("""
+			CREATE TABLE IF NOT EXISTS pages (
+				id INTEGER PRIMARY KEY,
+				site TEXT NOT NULL,
+				pageid INTEGER NOT NULL,
+				title TEXT NOT NULL,
+				revid INTEGER NOT NULL,
+				UNIQUE (site, pageid)
+			);
+			CREATE INDEX IF NOT EXISTS pages_title ON pages (site, title);
+			CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(title, body, tokenize="unicode61 remove_diacritics 2");
+			CREATE TABLE IF NOT EXISTS crawls (
+				site TEXT PRIMARY KEY,
+				cursor TEXT,
+				done INTEGER NOT NULL DEFAULT 0
+			);
+		""");
+		self._conn.commit();
+		done = {site for site, in self._conn.execute("SELECT site FROM crawls WHERE done")};
+		self.ready = {name: name in done for name in self.sites};
+
+	def _store(self, site: str, pages: typing.List[dict], cursor: typing.Optional[dict] = None, done: bool = False):
+		with self._lock, self._conn:
+			for page in pages:
+				if "missing" in page or "invalid" in page or "redirect" in page:
+					self._remove(site, page["title"]);
+					continue;
+
+				revision = next(iter(page.get("revisions", [])), None);
+				if revision is None:
+					continue; # content comes in a later continuation of the same batch
+
+				content = revision.get("slots", {}).get("main", revision).get("content", "");
+				rowid, = self._conn.execute("""
+					INSERT INTO pages (site, pageid, title, revid) VALUES (?, ?, ?, ?)
+					ON CONFLICT (site, pageid) DO UPDATE SET title = excluded.title, revid = excluded.revid
+					RETURNING id
+				""", (site, page["pageid"], page["title"], revision.get("revid", 0))).fetchone();
+				self._conn.execute("DELETE FROM documents WHERE rowid = ?", (rowid,));
+				self._conn.execute("INSERT INTO documents (rowid, title, body) VALUES (?, ?, ?)", (rowid, page["title"], plaintext(content)));
+
+			if cursor is not None or done:
+				self._conn.execute(
+					"INSERT OR REPLACE INTO crawls (site, cursor, done) VALUES (?, ?, ?)",
+					(site, json.dumps(cursor) if cursor is not None else None, int(done))
+				);
+
+	def _remove(self, site: str, title: str):
+		for rowid, in self._conn.execute("SELECT id FROM pages WHERE site = ? AND title = ?", (site, title)).fetchall():
+			self._conn.execute("DELETE FROM documents WHERE rowid = ?", (rowid,));
+			self._conn.execute("DELETE FROM pages WHERE id = ?", (rowid,));
+
+	def _cursor(self, site: str) -> typing.Optional[dict]:
+		with self._lock:
+			row = self._conn.execute("SELECT cursor FROM crawls WHERE site = ?", (site,)).fetchone();
+		return json.loads(row[0]) if row and row[0] else None;
+
+	async def crawl(self, name: str):
+		"""Loads a site from where its last crawl stopped, committing after every batch."""
+		loop = asyncio.get_running_loop();
+		cursor = await loop.run_in_executor(None, self._cursor, name);
+		params = {
+			"generator": "allpages",
+			"gapnamespace": self.namespace,
+			"gapfilterredir": "nonredirects",
+			"gaplimit": self.batch_size,
+			"prop": "revisions",
+			"rvprop": "ids|content",
+			"rvslots": "main"
+		};
+
+		while True:
+			resp = await self.sites[name].get("query", **params, **(cursor or {}));
+			pages = list(resp.get("query", {}).get("pages", {}).values());
+			cursor = resp.get("continue");
+			await loop.run_in_executor(None, self._store, name, pages, cursor or {}, cursor is None);
+			if cursor is None:
+				break;
+
+		self.ready[name] = True;
+
+	def on_change(self, change):
+		if change.namespace == self.namespace and change.kind in ("edit", "new", "move", "delete", "restore"):
+			self.pending[change.site].update(filter(None, (change.title, change.target)));
+
+	async def sync(self, name: str):
+		"""Refetches the pages queued by recent changes; deleted or moved-away titles are dropped."""
+		titles, self.pending[name] = sorted(self.pending[name]), set();
+		loop = asyncio.get_running_loop();
+		for start in range(0, len(titles), self.batch_size):
+			batch = titles[start:start + self.batch_size];
+			params = {"titles": batch, "prop": "info|revisions", "rvprop": "ids|content", "rvslots": "main"};
+			try:
+				pages = [];
+				async for query in self.sites[name].query(**params):
+					pages.extend(query.get("pages", {}).values());
+			except Exception:
+				self.pending[name].update(batch); # try again on the next round
+				raise;
+
+			# a moved page keeps its page id, so its row is renamed rather than duplicated
+			await loop.run_in_executor(None, self._store, name, pages);
+
+	@staticmethod
+	def expression(query: str, where: str):
+		"""Turns user input into an FTS5 expression matching every word, in titles only if asked."""
+		terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split());
+		return f"title : ({terms})" if where == "title" else terms;
+
+	def _search(self, site: str, expression: str, limit: int, offset: int):
+		with self._lock:
+			return self._conn.execute("""
+				SELECT pages.title, snippet(documents, 1, char(2), char(3), '…', 16)
+				FROM documents JOIN pages ON pages.id = documents.rowid
+				WHERE documents MATCH ? AND pages.site = ?
+				ORDER BY bm25(documents, 10.0, 1.0)
+				LIMIT ? OFFSET ?
+			""", (expression, site, limit, offset)).fetchall();
+
+	async def search(self, site: str, query: str, where: str = "text", limit: int = 10, offset: int = 0) -> typing.List[typing.Tuple[str, str]]:
+		"""Returns up to ``limit`` ranked ``(title, snippet)`` pairs; snippet matches are wrapped in ``\\x02`` and ``\\x03``."""
+		if not query.split():
+			return [];
+		return await asyncio.get_running_loop().run_in_executor(None, self._search, site, self.expression(query, where), limit, offset);
+
+	async def run(self):
+		for name in self.sites:
+			while not self.ready[name]:
+				try:
+					await self.crawl(name);
+					print(f"[MIRROR] Mirrored {name} for local search");
+				except asyncio.CancelledError:
+					raise;
+				except Exception as e:
+					traceback.print_exception(type(e), e, e.__traceback__);
+					await asyncio.sleep(60);
+
+		while True:
+			await asyncio.sleep(self.sync_interval);
+			for name in self.sites:
+				if self.pending[name]:
+					try:
+						await self.sync(name);
+					except asyncio.CancelledError:
+						raise;
+					except Exception as e:
+						traceback.print_exception(type(e), e, e.__traceback__);
+
+	def close(self):
+		with self._lock:
+			self._conn.close();
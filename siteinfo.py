@@ -0,0 +1,38 @@
+import asyncio, time, typing;
+from cache import SingleFlight;
+from mediawiki import AsyncSite;
+
+class SiteStatistics:
+	"""Serves every site's ``siteinfo`` statistics from the last snapshot.
+
+	Snapshots are refreshed on a schedule in the background. A snapshot older than
+	``max_age`` is still served, and a revalidation is started alongside it.
+	"""
+
+	def __init__(self, sites: typing.Iterable[typing.Tuple[str, AsyncSite]], interval: float = 300, max_age: float = 600):
+		self.sites = dict(sites);
+		self.interval = interval;
+		self.max_age = max_age;
+		self.snapshots: typing.Dict[str, typing.Tuple[dict, float]] = {};
+		self.flights = SingleFlight();
+
+	async def _fetch(self, name: str):
+		siteinfo = await self.sites[name].get("query", meta="siteinfo", siprop="statistics", maxage=int(self.interval), smaxage=int(self.interval));
+		self.snapshots[name] = (siteinfo["query"]["statistics"], time.time());
+		return self.snapshots[name];
+
+	def refresh(self, name: str) -> asyncio.Future:
+		return self.flights.start(name, lambda: self._fetch(name), on_error=SingleFlight.report);
+
+	async def get(self, name: str) -> typing.Tuple[dict, float]:
+		if (snapshot := self.snapshots.get(name)) is None:
+			return await asyncio.shield(self.refresh(name));
+
+		if time.time() - snapshot[1] > self.max_age:
+			self.refresh(name);
+		return snapshot;
+
+	async def run(self):
+		while True:
+			await asyncio.gather(*(self.refresh(name) for name in self.sites), return_exceptions=True);
+			await asyncio.sleep(self.interval);
@@ -0,0 +1,144 @@
+import asyncio, json, os, pickle, sqlite3, threading, typing;
+
+class SettingsStore:
+	"""Guild settings kept in SQLite (WAL mode), one row per guild and key.
+
+	Only values that differ from the schema are stored; a guild's settings are materialized
+	from ``defaults`` plus its rows the first time it is seen. Reads are served from an
+	in-memory map; once ``warm`` has loaded every stored guild, an unseen guild can have no
+	rows and gets the defaults without a query, and before that its rows are read in an
+	executor. Writes update that map immediately and are queued; a background task
+	coalesces them and commits each batch in one transaction.
+	"""
+
+	def __init__(self, filename: str = "cache/settings.db", defaults: typing.Optional[dict] = None, flush_interval: float = 1.0):
+		self.filename = filename;
+		self.defaults = defaults or {};
+		self.flush_interval = flush_interval;
+		self._guilds: typing.Dict[int, dict] = {};
+		self._snapshots: typing.Dict[int, typing.Any] = {};
+		self._dirty: typing.Dict[typing.Tuple[int, str], typing.Any] = {};
+		self._written: typing.Dict[int, dict] = {}; # every write made by this process, newer than any row read
+		self.warmed = False;
+		self._lock = threading.Lock();
+		self._wakeup = asyncio.Event();
+
+		os.makedirs(os.path.dirname(filename) or ".", exist_ok=True);
+		self._conn = sqlite3.connect(filename, check_same_thread=False);
+		self._conn.execute("PRAGMA journal_mode=WAL");
+		self._conn.execute("PRAGMA synchronous=NORMAL");
+		self._conn.execute("""
+			CREATE TABLE IF NOT EXISTS settings (
+				guild_id INTEGER NOT NULL,
+				key TEXT NOT NULL,
+				value TEXT NOT NULL,
+				PRIMARY KEY (guild_id, key)
+			) WITHOUT ROWID
+		""");
+		self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)");
+		self._conn.commit();
+
+	def _load(self, guild_id: int):
+		with self._lock:
+			rows = self._conn.execute("SELECT key, value FROM settings WHERE guild_id = ?", (guild_id,)).fetchall();
+		return {key: json.loads(value) for key, value in rows};
+
+	def _materialize(self, guild_id: int, values: dict):
+		return self._guilds.setdefault(guild_id, {**self.defaults, **values, **self._written.get(guild_id, {})});
+
+	async def get(self, guild_id: int) -> dict:
+		if (settings := self._guilds.get(guild_id)) is not None:
+			return settings;
+		if self.warmed:
+			return self._materialize(guild_id, {});
+		return self._materialize(guild_id, await asyncio.get_running_loop().run_in_executor(None, self._load, guild_id));
+
+	def _load_all(self):
+		with self._lock:
+			rows = self._conn.execute("SELECT guild_id, key, value FROM settings ORDER BY guild_id").fetchall();
+
+		guilds: typing.Dict[int, dict] = {};
+		for guild_id, key, value in rows:
+			guilds.setdefault(guild_id, {})[key] = json.loads(value);
+		return guilds;
+
+	async def warm(self):
+		"""Materializes every stored guild in one background query, without blocking the loop."""
+		guilds = await asyncio.get_running_loop().run_in_executor(None, self._load_all);
+		for guild_id, values in guilds.items():
+			self._materialize(guild_id, values);
+		self.warmed = True;
+		return len(guilds);
+
+	async def snapshot(self, guild_id: int, factory: typing.Callable[[dict], typing.Any]):
+		"""Returns ``factory(settings)`` for a guild, rebuilt only after its settings change."""
+		if (snapshot := self._snapshots.get(guild_id)) is None:
+			snapshot = self._snapshots[guild_id] = factory(await self.get(guild_id));
+		return snapshot;
+
+	def set(self, guild_id: int, key: str, value):
+		self._written.setdefault(guild_id, {})[key] = value;
+		if (settings := self._guilds.get(guild_id)) is not None:
+			settings[key] = value;
+		self._snapshots.pop(guild_id, None);
+		with self._lock:
+			self._dirty[(guild_id, key)] = value;
+		self._wakeup.set();
+
+	def flush(self):
+		with self._lock:
+			if not self._dirty:
+				return 0;
+			dirty, self._dirty = self._dirty, {};
+			with self._conn:
+				self._conn.executemany(
+					"INSERT OR REPLACE INTO settings (guild_id, key, value) VALUES (?, ?, ?)",
+					[(guild_id, key, json.dumps(value)) for (guild_id, key), value in dirty.items()]
+				);
+		return len(dirty);
+
+	async def run(self):
+		loop = asyncio.get_running_loop();
+		while True:
+			await self._wakeup.wait();
+			await asyncio.sleep(self.flush_interval);
+			self._wakeup.clear();
+			await loop.run_in_executor(None, self.flush);
+
+	def import_pickles(self, directory: str):
+		"""Imports the legacy ``settings/<guild id>.pkl`` files, once; blocking, so run it in an executor.
+
+		The import is recorded in ``meta``, since a deployment where no guild changed a
+		setting imports no rows at all and would otherwise be imported again on every start.
+		"""
+		with self._lock:
+			if self._conn.execute("SELECT 1 FROM meta WHERE key = 'pickles_imported'").fetchone():
+				return 0;
+			# stores filled before the marker existed were imported already
+			if not os.path.isdir(directory) or self._conn.execute("SELECT 1 FROM settings LIMIT 1").fetchone():
+				with self._conn:
+					self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pickles_imported', '1')");
+				return 0;
+
+		rows, imported = [], 0;
+		for filename in os.listdir(directory):
+			stem, ext = os.path.splitext(filename);
+			if ext != ".pkl" or not stem.isdigit():
+				continue;
+
+			with open(os.path.join(directory, filename), "rb") as f:
+				settings = pickle.load(f);
+			rows.extend(
+				(int(stem), key, json.dumps(value)) for key, value in settings.items()
+				if key != "metadata" and (key not in self.defaults or self.defaults[key] != value)
+			);
+			imported += 1;
+
+		with self._lock, self._conn:
+			self._conn.executemany("INSERT OR REPLACE INTO settings (guild_id, key, value) VALUES (?, ?, ?)", rows);
+			self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pickles_imported', '1')");
+		return imported;
+
+	def close(self):
+		self.flush();
+		self._conn.close();
@@ -0,0 +1,132 @@
+import asyncio, bisect, heapq, itertools, traceback, typing;
+from collections import Counter, defaultdict;
+from mediawiki import AsyncSite;
+
+class TitleIndex:
+	"""An in-memory index of every page title on a site, with a trigram candidate lookup.
+
+	The index is built once from ``list=allpages`` and then kept current by applying the
+	page creations, moves, deletions and restorations published by the recent-changes poller.
+	Titles, redirects included, are also kept in a case-folded sorted array for prefix lookups.
+	"""
+
+	def __init__(self, site: AsyncSite, namespace: int = 0):
+		self.site = site;
+		self.namespace = namespace;
+		self.titles: typing.Set[str] = set();
+		self.grams: typing.DefaultDict[str, typing.Set[str]] = defaultdict(set);
+		self.sorted: typing.List[typing.Tuple[str, str]] = []; # (folded title, title), in order
+		self.ready = False;
+		self._backlog: typing.Optional[typing.List[dict]] = None;
+
+	@staticmethod
+	def trigrams(text: str):
+		padded = f"  {text.casefold()} ";
+		return {padded[i:i + 3] for i in range(len(padded) - 2)};
+
+	def add(self, title: str):
+		if title in self.titles:
+			return;
+		self.titles.add(title);
+		for gram in self.trigrams(title):
+			self.grams[gram].add(title);
+		bisect.insort(self.sorted, (self.fold(title), title));
+
+	def load(self, titles: typing.Iterable[str]):
+		"""Adds many titles at once, sorting them in one go rather than inserting one at a time."""
+		for title in titles:
+			if title not in self.titles:
+				self.titles.add(title);
+				for gram in self.trigrams(title):
+					self.grams[gram].add(title);
+		self.sorted = sorted((self.fold(title), title) for title in self.titles);
+
+	def remove(self, title: str):
+		if title not in self.titles:
+			return;
+		self.titles.discard(title);
+		for gram in self.trigrams(title):
+			if (bucket := self.grams.get(gram)) is not None:
+				bucket.discard(title);
+				if not bucket:
+					del self.grams[gram];
+		position = bisect.bisect_left(self.sorted, (self.fold(title), title));
+		if position < len(self.sorted) and self.sorted[position][1] == title:
+			del self.sorted[position];
+
+	def candidates(self, query: str, limit: int = 50):
+		scores = Counter();
+		for gram in self.trigrams(query):
+			scores.update(self.grams.get(gram, ()));
+		return [title for title, _ in scores.most_common(limit)];
+
+	@staticmethod
+	def fold(text: str):
+		return " ".join(text.replace("_", " ").split()).casefold();
+
+	def complete(self, prefix: str) -> typing.Iterator[typing.Tuple[str, str]]:
+		"""Yields ``(folded title, title)`` for every title starting with ``prefix``, in order."""
+		folded = self.fold(prefix);
+		if folded and prefix[-1:].isspace():
+			folded += " "; # "act " should not complete to "Actor"
+		for position in range(bisect.bisect_left(self.sorted, (folded,)), len(self.sorted)):
+			if not self.sorted[position][0].startswith(folded):
+				break;
+			yield self.sorted[position];
+
+	async def build(self):
+		fresh = TitleIndex(self.site, self.namespace);
+		self._backlog = [];
+		try:
+			titles = [];
+			async for query in self.site.query(list="allpages", apnamespace=self.namespace, aplimit="max"):
+				titles.extend(page["title"] for page in query.get("allpages", []));
+			fresh.load(titles);
+
+			# changes published while crawling may not be reflected in the pages we got
+			for change in self._backlog:
+				fresh.apply(change);
+		finally:
+			self._backlog = None;
+
+		self.titles, self.grams, self.sorted = fresh.titles, fresh.grams, fresh.sorted;
+		self.ready = True;
+
+	def apply(self, change: dict):
+		if self._backlog is not None:
+			self._backlog.append(change);
+
+		ours = change.get("ns") == self.namespace;
+		if change.get("type") == "new" and ours:
+			self.add(change["title"]);
+		elif change.get("type") == "log":
+			logtype, logaction = change.get("logtype"), change.get("logaction");
+			params = change.get("logparams", {});
+			if logtype == "move":
+				if params.get("target_ns") == self.namespace:
+					self.add(params["target_title"]);
+				if ours and "suppressredirect" in params:
+					self.remove(change["title"]);
+			elif logtype == "delete" and logaction == "delete" and ours:
+				self.remove(change["title"]);
+			elif logtype == "delete" and logaction == "restore" and ours:
+				self.add(change["title"]);
+
+	async def maintain(self, retry_interval: float = 60):
+		while not self.ready:
+			try:
+				await self.build();
+				print(f"[INDEX] Indexed {len(self.titles)} titles on {self.site.host}");
+			except asyncio.CancelledError:
+				raise;
+			except Exception as e:
+				traceback.print_exception(type(e), e, e.__traceback__);
+				await asyncio.sleep(retry_interval);
+
+def complete(indexes: typing.Iterable[TitleIndex], prefix: str, limit: int = 25, max_length: typing.Optional[int] = None) -> typing.List[str]:
+	"""Merges several indexes' completions of ``prefix`` into ``limit`` distinct titles, in order."""
+	merged = heapq.merge(*(index.complete(prefix) for index in indexes if index.ready));
+	titles = (title for title, _ in itertools.groupby(title for _, title in merged));
+	if max_length is not None:
+		titles = (title for title in titles if len(title) <= max_length);
+	return list(itertools.islice(titles, limit));
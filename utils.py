@@ -1,2 +1,52 @@
+import typing;
+from dataclasses import dataclass;
+from datetime import datetime, timezone;
+
 def chunk_list(lst, n):
-	return [lst[i:i + n] for i in range(0, len(lst), n)];
\ No newline at end of file
+	return [lst[i:i + n] for i in range(0, len(lst), n)];
+
+def parse_timestamp(timestamp: str):
+	return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc);
+
+@dataclass
+class MergedResult:
+	title: str
+	links: typing.List[typing.Tuple[str, str]] # (site name, url), in site order
+	rank: int
+
+class ResultMerger:
+	"""Merges ranked search results from several sites into one list in linear time.
+
+	Results are grouped by normalized title, so a page present on several sites becomes a
+	single entry carrying one link per site. Each batch is ordered by per-site rank with
+	ties broken by site order, which interleaves the sites; entries from earlier batches
+	never move, so pages that were already shown stay stable.
+	"""
+
+	def __init__(self, sites: typing.Iterable[str]):
+		self.order = {name: index for index, name in enumerate(sites)};
+		self.entries: typing.List[MergedResult] = [];
+		self.positions: typing.Dict[str, int] = {};
+
+	@staticmethod
+	def normalize(title: str):
+		return " ".join(title.replace("_", " ").split()).casefold();
+
+	def add(self, results: typing.Iterable[typing.Tuple[str, int, str, str]]):
+		"""Adds a batch of ``(site, rank, title, url)`` results and returns how many new entries it produced."""
+		added = 0;
+		for site, rank, title, url in sorted(results, key=lambda result: (result[1], self.order[result[0]])):
+			key = self.normalize(title);
+			if (position := self.positions.get(key)) is not None:
+				entry = self.entries[position];
+				if all(name != site for name, _ in entry.links):
+					entry.links.append((site, url));
+					entry.links.sort(key=lambda link: self.order[link[0]]);
+			else:
+				self.positions[key] = len(self.entries);
+				self.entries.append(MergedResult(title, [(site, url)], rank));
+				added += 1;
+		return added;
+
+	def __len__(self):
+		return len(self.entries);
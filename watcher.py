@@ -0,0 +1,102 @@
+import asyncio, ctypes, ctypes.util, os, struct, sys, typing;
+from pathlib import Path;
+
+IN_CLOSE_WRITE = 0x00000008;
+IN_MOVED_TO = 0x00000080;
+IN_CREATE = 0x00000100;
+IN_NONBLOCK = 0o4000;
+IN_CLOEXEC = 0o2000000;
+_event = struct.Struct("iIII");
+
+class CogWatcher:
+	"""Reports batches of changed or newly added ``.py`` files in a directory.
+
+	On Linux this uses inotify, so an idle watcher costs no wakeups at all; elsewhere it
+	falls back to polling mtimes. Bursts of saves are debounced into a single batch.
+	"""
+
+	def __init__(self, directory: typing.Union[str, Path], debounce: float = 0.5, poll_interval: float = 1.0):
+		self.directory = Path(directory);
+		self.debounce = debounce;
+		self.poll_interval = poll_interval;
+		self._pending: typing.Set[Path] = set();
+		self._timer: typing.Optional[asyncio.TimerHandle] = None;
+		self._batches: asyncio.Queue = asyncio.Queue();
+
+	def _notify(self, path: Path):
+		if path.suffix != ".py":
+			return;
+		self._pending.add(path);
+		if self._timer is not None:
+			self._timer.cancel();
+		self._timer = asyncio.get_running_loop().call_later(self.debounce, self._release);
+
+	def _release(self):
+		self._timer = None;
+		batch, self._pending = self._pending, set();
+		self._batches.put_nowait(batch);
+
+	def _inotify(self):
+		if not sys.platform.startswith("linux"):
+			return None;
+		try:
+			libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True);
+			fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC);
+			if fd < 0:
+				return None;
+			if libc.inotify_add_watch(fd, str(self.directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+				os.close(fd);
+				return None;
+			return fd;
+		except (OSError, AttributeError):
+			return None;
+
+	def _read_events(self, fd: int):
+		try:
+			data = os.read(fd, 64 * 1024);
+		except BlockingIOError:
+			return;
+
+		offset = 0;
+		while offset + _event.size <= len(data):
+			_, mask, _, length = _event.unpack_from(data, offset);
+			name = data[offset + _event.size:offset + _event.size + length].rstrip(b"\0").decode();
+			offset += _event.size + length;
+			if name and mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+				self._notify(self.directory / name);
+
+	def _mtimes(self):
+		return {path: path.stat().st_mtime for path in self.directory.glob("*.py")};
+
+	async def _poll(self):
+		seen = self._mtimes();
+		while True:
+			await asyncio.sleep(self.poll_interval);
+			current = self._mtimes();
+			for path, mtime in current.items():
+				if seen.get(path) != mtime:
+					self._notify(path);
+			seen = current;
+
+	async def changes(self) -> typing.AsyncIterator[typing.Set[Path]]:
+		loop = asyncio.get_running_loop();
+		fd = self._inotify();
+		poller = None;
+		if fd is not None:
+			loop.add_reader(fd, self._read_events, fd);
+			print(f"[WATCHER] Watching {self.directory} with inotify");
+		else:
+			poller = asyncio.create_task(self._poll());
+			print(f"[WATCHER] Watching {self.directory} by polling every {self.poll_interval}s");
+
+		try:
+			while True:
+				yield await self._batches.get();
+		finally:
+			if fd is not None:
+				loop.remove_reader(fd);
+				os.close(fd);
+			if poller is not None:
+				poller.cancel();
+			if self._timer is not None:
+				self._timer.cancel();